@@ -0,0 +1,112 @@
+"""
+Tree Build Benchmark — wall-clock comparison of the serial, concurrent
+and level-batched prerequisite tree builders against a simulated-latency LLM.
+
+Usage (from backend/):
+    python benchmarks/bench_tree_build.py [--latency 0.2] [--depth 4] [--concurrency 8]
+"""
+
+import argparse
+import asyncio
+import hashlib
+import json
+import os
+import re
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+os.environ["CACHE_DB"] = os.path.join(tempfile.mkdtemp(), "cache.db")
+
+from config import config  # noqa: E402
+from modules import cache  # noqa: E402
+from modules import prerequisite as prereq_mod  # noqa: E402
+
+# A finite pool of concept names so that topics repeat across branches,
+# which exercises the `visited` cycle handling.
+_POOL = [f"Concept {i}" for i in range(400)]
+
+
+class FakeLLM:
+    """Deterministic LLM stand-in that sleeps `latency` seconds per call."""
+
+    def __init__(self, latency: float):
+        self.latency = latency
+        self.calls = 0
+
+    def __call__(self, prompt: str, system_prompt: str = "", temperature: float = 0.7, max_tokens: int = 4096, family=None) -> str:
+        self.calls += 1
+        time.sleep(self.latency)
+        return self._respond(prompt)
+
+    async def acall(self, prompt: str, system_prompt: str = "", temperature: float = 0.7, max_tokens: int = 4096, family=None) -> str:
+        self.calls += 1
+        await asyncio.sleep(self.latency)
+        return self._respond(prompt)
+
+    def _respond(self, prompt: str) -> str:
+        batch = re.search(r"\(JSON array\):\n(\[.*\])", prompt)
+        if batch:
+            topics = json.loads(batch.group(1))
+            if prompt.startswith("Explain"):
+                return json.dumps({t: f"{t} is a simple idea." for t in topics})
+            return json.dumps({t: self._decomposition(t) for t in topics})
+        topic = re.search(r'"([^"]+)"', prompt).group(1)
+        if prompt.startswith("Explain"):
+            return f"{topic} is a simple idea."
+        answer = self._decomposition(topic)
+        if "fact" in answer:
+            return "FACT"
+        return "\n".join(f"{i + 1}. {p}" for i, p in enumerate(answer["prerequisites"]))
+
+    @staticmethod
+    def _decomposition(topic: str) -> dict:
+        digest = hashlib.sha256(topic.encode()).digest()
+        if digest[0] % 5 == 0:
+            return {"fact": f"{topic} is a simple idea."}
+        n = 2 + digest[1] % 3
+        return {"prerequisites": [_POOL[digest[2 + i] % len(_POOL)] for i in range(n)]}
+
+
+def _fresh_cache() -> None:
+    cache.close()
+    config.CACHE_DB = os.path.join(tempfile.mkdtemp(), "cache.db")
+
+
+def _run(label: str, build, latency: float) -> tuple[dict, float, int]:
+    _fresh_cache()
+    llm = FakeLLM(latency)
+    prereq_mod.call_llm = llm
+    prereq_mod.acall_llm = llm.acall
+    start = time.perf_counter()
+    tree = build()
+    elapsed = time.perf_counter() - start
+    print(f"{label:<12} {elapsed:8.2f}s  {llm.calls:4d} LLM calls")
+    return tree, elapsed, llm.calls
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.strip().split("\n")[0])
+    parser.add_argument("--latency", type=float, default=0.2, help="simulated seconds per LLM call")
+    parser.add_argument("--depth", type=int, default=4, help="max tree depth")
+    parser.add_argument("--concurrency", type=int, default=config.TREE_BUILD_CONCURRENCY)
+    parser.add_argument("--topic", default="Machine Learning")
+    args = parser.parse_args()
+
+    serial_tree, serial_secs, _ = _run(
+        "serial",
+        lambda: prereq_mod.build_prerequisite_tree(args.topic, max_depth=args.depth),
+        args.latency,
+    )
+    def _concurrent(batched: bool):
+        config.TREE_BATCH_DECOMPOSE = batched
+        return asyncio.run(prereq_mod.build_prerequisite_tree_concurrent(
+            args.topic, max_depth=args.depth, max_concurrency=args.concurrency,
+        ))
+
+    concurrent_tree, concurrent_secs, _ = _run("concurrent", lambda: _concurrent(False), args.latency)
+    batched_tree, batched_secs, _ = _run("batched", lambda: _concurrent(True), args.latency)
+
+    print(f"speedup      {serial_secs / concurrent_secs:8.2f}x concurrent, {serial_secs / batched_secs:.2f}x batched")
+    print(f"same tree    {serial_tree == concurrent_tree and serial_tree == batched_tree}")
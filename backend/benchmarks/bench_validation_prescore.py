@@ -0,0 +1,81 @@
+"""
+Validation Pre-score Benchmark — agreement between the local pre-scorer and
+recorded LLM verdicts (the validation_verdicts table, or a JSONL export of
+it), for one or more coverage thresholds.
+
+While the pre-scorer is on, answers it fails are only LLM-judged for a
+VALIDATION_SHADOW_SAMPLE fraction; those verdicts carry weight 1/sample and
+every figure below is weighted accordingly. With VALIDATION_SHADOW_SAMPLE=0
+the recorded set holds only answers the pre-scorer passed on, and agreement
+is overstated: collect with VALIDATION_PRESCORE_ENABLED=False instead.
+
+Usage (from backend/):
+    python benchmarks/bench_validation_prescore.py [--dataset verdicts.jsonl]
+        [--min-words 5] [--coverage-sim 0.25 0.3 0.35] [--fail-coverage 0.0]
+"""
+
+import argparse
+import json
+import os
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+from config import config  # noqa: E402
+from modules import cache  # noqa: E402
+from modules import validator  # noqa: E402
+
+
+def _load(dataset: str | None) -> list[dict]:
+    if dataset is None:
+        return cache.get_validation_verdicts()
+    with open(dataset, encoding="utf-8") as f:
+        return [json.loads(line) for line in f if line.strip()]
+
+
+def _evaluate(verdicts: list[dict]) -> dict:
+    """Pre-score every recorded answer and compare with the (weighted) LLM verdicts."""
+    decided = false_fails = llm_fails = 0.0
+    for v in verdicts:
+        weight = v.get("weight", 1.0)
+        llm_fails += weight * (not v["passed"])
+        result = validator.prescore(v["answer"], v["prerequisites"])
+        if result is not None:
+            decided += weight
+            false_fails += weight * v["passed"]
+    return {
+        "decided": decided,
+        "agreement": (decided - false_fails) / decided if decided else 1.0,
+        "false_fails": false_fails,
+        "fails_caught": (decided - false_fails) / llm_fails if llm_fails else 0.0,
+    }
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.strip().split("\n")[0])
+    parser.add_argument("--dataset", help="JSONL of {answer, prerequisites, passed[, weight]}; default: the cache DB")
+    parser.add_argument("--min-words", type=int, default=config.VALIDATION_MIN_WORDS)
+    parser.add_argument("--coverage-sim", type=float, nargs="+", default=[config.VALIDATION_COVERAGE_SIM])
+    parser.add_argument("--fail-coverage", type=float, default=config.VALIDATION_FAIL_COVERAGE)
+    args = parser.parse_args()
+
+    verdicts = _load(args.dataset)
+    if not verdicts:
+        sys.exit("No recorded verdicts (set VALIDATION_RECORD_VERDICTS and answer some questions first).")
+    passed = sum(v["passed"] for v in verdicts)
+    shadow = sum(v.get("weight", 1.0) != 1.0 for v in verdicts)
+    print(
+        f"{len(verdicts)} verdicts ({shadow} shadow-judged pre-score fails), "
+        f"{passed} LLM passes, {len(verdicts) - passed} LLM fails"
+    )
+
+    config.VALIDATION_MIN_WORDS = args.min_words
+    config.VALIDATION_FAIL_COVERAGE = args.fail_coverage
+    print(f"{'coverage_sim':>12} {'decided':>8} {'agreement':>10} {'false_fails':>12} {'fails_caught':>13}")
+    for sim in args.coverage_sim:
+        config.VALIDATION_COVERAGE_SIM = sim
+        r = _evaluate(verdicts)
+        print(
+            f"{sim:12.2f} {r['decided']:8.0f} {r['agreement']:10.1%} "
+            f"{r['false_fails']:12.0f} {r['fails_caught']:13.1%}"
+        )
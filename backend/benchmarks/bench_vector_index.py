@@ -0,0 +1,61 @@
+"""
+Vector Index Benchmark — build time, query latency and recall@k of the
+HNSW and IVF index modes against exact (flat) search on synthetic
+clustered embeddings.
+
+Usage (from backend/):
+    python benchmarks/bench_vector_index.py [--lines 50000] [--dim 384] [--queries 500] [--k 5]
+"""
+
+import argparse
+import os
+import sys
+import time
+
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+from config import config  # noqa: E402
+from modules import search  # noqa: E402
+
+
+def _clustered(n: int, dim: int, rng: np.random.Generator) -> np.ndarray:
+    """Unit vectors scattered around ~sqrt(n) topic centres, like sentence embeddings."""
+    centres = rng.standard_normal((max(1, int(np.sqrt(n))), dim)).astype("float32")
+    points = centres[rng.integers(0, len(centres), n)] + 0.6 * rng.standard_normal((n, dim)).astype("float32")
+    return search._normalized(points)
+
+
+def _run(kind: str, corpus: np.ndarray, queries: np.ndarray, k: int) -> tuple[np.ndarray, float, float]:
+    start = time.perf_counter()
+    index = search.make_index(kind, corpus)
+    index.add_with_ids(corpus, np.arange(len(corpus), dtype="int64"))
+    build_secs = time.perf_counter() - start
+
+    start = time.perf_counter()
+    ids = np.vstack([index.search(q.reshape(1, -1), k)[1] for q in queries])
+    query_ms = (time.perf_counter() - start) * 1000 / len(queries)
+    return ids, build_secs, query_ms
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.strip().split("\n")[0])
+    parser.add_argument("--lines", type=int, default=50_000, help="corpus size")
+    parser.add_argument("--dim", type=int, default=384, help="embedding dimension")
+    parser.add_argument("--queries", type=int, default=500)
+    parser.add_argument("--k", type=int, default=config.TOP_K_VECTOR)
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(0)
+    # Queries come from the same topic clusters as the corpus, but are held out of it
+    points = _clustered(args.lines + args.queries, args.dim, rng)
+    corpus, queries = points[:args.lines], points[args.lines:]
+    print(f"auto mode picks '{search.choose_index_kind(args.lines)}' for {args.lines} lines")
+
+    truth, build_secs, query_ms = _run("flat", corpus, queries, args.k)
+    print(f"{'flat':<6} build {build_secs:7.2f}s  query {query_ms:7.3f}ms  recall@{args.k} 1.000")
+    for kind in ("hnsw", "ivf"):
+        ids, build_secs, query_ms = _run(kind, corpus, queries, args.k)
+        recall = np.mean([len(set(a) & set(b)) / args.k for a, b in zip(ids, truth)])
+        print(f"{kind:<6} build {build_secs:7.2f}s  query {query_ms:7.3f}ms  recall@{args.k} {recall:.3f}")
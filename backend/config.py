@@ -7,14 +7,70 @@ class Config:
     NVIDIA_API_KEY: str = os.getenv("NVIDIA_API_KEY", "")
     NVIDIA_BASE_URL: str = os.getenv("NVIDIA_BASE_URL", "https://integrate.api.nvidia.com/v1")
     LLM_MODEL: str = os.getenv("LLM_MODEL", "z-ai/glm5")
+    LLM_MAX_CONNECTIONS: int = 20
+    LLM_MAX_KEEPALIVE: int = 10
+    LLM_KEEPALIVE_SECS: float = 30.0
+    LLM_TIMEOUT_SECS: float = 120.0
+    LLM_CACHE_ENABLED: bool = True
+    LLM_CACHE_L1_MAX: int = 2048
+    # Prompt family → seconds its completions are reused; unlisted families are never cached
+    LLM_CACHE_POLICY: dict = {
+        "decompose": 7 * 86400,
+        "fact": 30 * 86400,
+        "validate": 7 * 86400,
+        "hint": 86400,
+    }
     EMBEDDING_MODEL: str = os.getenv("EMBEDDING_MODEL", "all-MiniLM-L6-v2")
     MEMORY_DIR: str = os.getenv("MEMORY_DIR", os.path.join(os.path.dirname(__file__), "..", "data", "memory"))
     CACHE_DB: str = os.getenv("CACHE_DB", os.path.join(os.path.dirname(__file__), "..", "data", "memory", "cache.db"))
     MAX_TREE_DEPTH: int = 5
+    TREE_BUILD_CONCURRENCY: int = 8
+    TREE_BATCH_DECOMPOSE: bool = True
+    TREE_BATCH_MAX_TOPICS: int = 12
+    TREE_SEMANTIC_MATCH: bool = True
+    TREE_MATCH_THRESHOLD: float = 0.85
+    SQLITE_READ_POOL: int = 4
+    SQLITE_CACHE_KB: int = 16384
+    SQLITE_MMAP_BYTES: int = 256 * 1024 * 1024
+    WRITE_BATCH_MS: int = 5
+    WRITE_BATCH_MAX: int = 256
     CACHE_TTL_DAYS: int = 7
+    EXPLANATION_CACHE_TTL_DAYS: int = 30
     SYNTHESIS_DIFFICULTY: str = "medium"
     SYNTHESIS_MAX_ATTEMPTS: int = 3
+    TURN_LLM_CONCURRENCY: int = 3
+    VALIDATION_PRESCORE_ENABLED: bool = True
+    VALIDATION_MIN_WORDS: int = 5
+    VALIDATION_COVERAGE_SIM: float = 0.3
+    VALIDATION_FAIL_COVERAGE: float = 0.0
+    VALIDATION_RECORD_VERDICTS: bool = True
+    VALIDATION_SHADOW_SAMPLE: float = 0.1
+    VALIDATION_VERDICTS_MAX_ROWS: int = 10_000
+    INTENT_EMBEDDINGS: bool = True
+    INTENT_MIN_SIM: float = 0.55
+    PREFETCH_ENABLED: bool = True
+    PREFETCH_TTL_SECS: int = 300
+    PREFETCH_SESSION_IDLE_SECS: int = 900
+    SESSION_STORE_ENABLED: bool = True
+    SESSION_STORE_MAX: int = 1000
+    SESSION_IDLE_SECS: int = 3600
+    SINGLE_FLIGHT_CROSS_PROCESS: bool = True
+    SINGLE_FLIGHT_POLL_MS: int = 200
+    SINGLE_FLIGHT_TREE_LEASE_SECS: int = 600
+    EMBEDDING_CACHE_MAX_ROWS: int = 100_000
+    EMBEDDING_CACHE_MAX_BYTES: int = 256 * 1024 * 1024
+    EMBEDDING_EVICT_BATCH: int = 1000
+    EMBEDDING_ACCESS_FLUSH_SECS: int = 30
     TOP_K_EXACT: int = 3
     TOP_K_VECTOR: int = 5
+    VECTOR_INDEX_TYPE: str = "auto"
+    VECTOR_ANN_MIN_LINES: int = 10_000
+    VECTOR_IVF_MIN_LINES: int = 100_000
+    VECTOR_HNSW_M: int = 32
+    VECTOR_HNSW_EF_CONSTRUCTION: int = 80
+    VECTOR_HNSW_EF_SEARCH: int = 64
+    VECTOR_IVF_NPROBE: int = 16
+    VECTOR_MAX_TOMBSTONE_RATIO: float = 0.2
+    VECTOR_INDEX_SAVE_SECS: int = 60
 
 config = Config()
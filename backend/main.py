@@ -3,27 +3,37 @@ Learning Chatbot — FastAPI Backend (Stateless)
 Serves the chat API and static frontend files.
 All session state lives in the frontend (localStorage).
 The backend receives session_context in each request and returns session_update.
+Optionally, the server keeps a versioned copy of each session so clients can
+send only session_id + session_version and receive only the changed fields.
 """
 
+import asyncio
 import json
 import os
 import time
 from datetime import datetime
 from contextlib import asynccontextmanager
-from typing import Optional
+from typing import Awaitable, Optional
 
-from fastapi import FastAPI
+from fastapi import FastAPI, HTTPException
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.staticfiles import StaticFiles
-from fastapi.responses import FileResponse
+from fastapi.responses import FileResponse, StreamingResponse
 from pydantic import BaseModel
 
 from config import config
 from modules import cache
 from modules import prerequisite as prereq_mod
+from modules import search
 from modules import explainer
 from modules import synthesis
 from modules import validator
+from modules import llm_client
+from modules import llm_cache
+from modules import intent
+from modules import prefetch
+from modules import session_store
+from modules import single_flight
 
 
 # ── Pydantic models ────────────────────────────────────────────────────
@@ -43,6 +53,8 @@ class SessionContext(BaseModel):
 class ChatRequest(BaseModel):
     message: str
     session_context: Optional[SessionContext] = None
+    session_id: str = ""
+    session_version: Optional[str | int] = None  # int: saved by a client before versions were tokens
 
 
 class ChatResponse(BaseModel):
@@ -58,6 +70,10 @@ class ChatResponse(BaseModel):
 @asynccontextmanager
 async def lifespan(app: FastAPI):
     yield
+    await llm_client.aclose()
+    search.save_index()
+    cache.flush_access_times()
+    cache.close()
 
 
 # ── FastAPI app ────────────────────────────────────────────────────────
@@ -75,49 +91,81 @@ app.add_middleware(
 
 @app.post("/api/chat")
 async def chat(req: ChatRequest) -> dict:
-    """Main chat endpoint — stateless. Receives session_context, returns session_update."""
+    """
+    Main chat endpoint. Receives session_context, returns session_update —
+    or, with session_version instead of a context, works from the server-side
+    session store and returns only the changed fields. A stale or unknown
+    version is answered with 409; the client then resends its full context.
+    """
     user_msg = req.message.strip()
     if not user_msg:
         return {"response": "Please type something!", "type": "message"}
+    return await _chat_turn(req, user_msg)
+
+
+@app.post("/api/chat/stream")
+async def chat_stream(req: ChatRequest) -> StreamingResponse:
+    """
+    Streaming variant of /api/chat. Emits NDJSON frames:
+    {"event": "token", "text": ...} as text is generated, then one
+    {"event": "done", ...} frame carrying the same payload /api/chat returns.
+    """
+    if req.session_version is not None and req.message.strip():
+        _stored_context(req)  # fail fast with a 409 before the stream starts
+
+    queue: asyncio.Queue = asyncio.Queue()
+
+    async def _produce() -> None:
+        llm_client.set_token_sink(queue.put_nowait)
+        try:
+            result = await chat(req)
+        except HTTPException as e:
+            # The session moved on while this request waited for its turn
+            result = {"event": "conflict", **e.detail}
+        except Exception as e:
+            print(f"[STREAM ERROR] {e}")
+            result = {"response": f"Error: {e}", "type": "message"}
+        queue.put_nowait(result)
+
+    async def _frames():
+        task = asyncio.create_task(_produce())
+        try:
+            while True:
+                item = await queue.get()
+                if isinstance(item, dict):
+                    yield json.dumps(item if "event" in item else {"event": "done", **item}) + "\n"
+                    return
+                yield json.dumps({"event": "token", "text": item}) + "\n"
+        finally:
+            # Client went away mid-stream
+            if not task.done():
+                task.cancel()
+
+    return StreamingResponse(_frames(), media_type="application/x-ndjson")
 
-    ctx = req.session_context or SessionContext()
 
-    # If waiting for synthesis answer → validate it
-    if ctx.waiting_for_synthesis:
-        return _handle_synthesis_answer(user_msg, ctx)
+@app.post("/api/reset")
+async def reset_session() -> dict:
+    """Reset server-side caches if needed."""
+    return {"status": "ok", "message": "Session reset."}
 
-    # If we have a teaching flow going and haven't explained yet
-    if ctx.tree and not ctx.explained_current and ctx.current_index < len(ctx.teaching_order):
-        return _explain_current_concept(ctx)
 
-    # Check if this is a learning request
-    if _is_learning_request(user_msg):
-        topic = _extract_topic(user_msg)
-        return _start_learning(topic, ctx)
+@app.get("/api/stats/llm-cache")
+async def llm_cache_stats() -> dict:
+    """Per-prompt-family hit/miss counters of the LLM response cache."""
+    return {"families": llm_cache.stats()}
 
-    # General conversation or "yes/ready/next" to proceed
-    if ctx.tree and ctx.current_index < len(ctx.teaching_order):
-        lower = user_msg.lower()
-        if any(w in lower for w in ["yes", "ready", "next", "continue", "ok", "sure", "yeah", "got it", "makes sense"]):
-            return _ask_synthesis_or_next(ctx)
 
-    # Fallback: general response
-    from modules.llm_client import call_llm
-    response = call_llm(
-        user_msg,
-        system_prompt=(
-            "You are a friendly learning assistant focused on recall-based learning. "
-            "If the user wants to learn a topic, tell them to type 'Learn: [topic name]'. "
-            "Keep responses brief and helpful."
-        ),
-    )
-    return {"response": response, "type": "message"}
+@app.get("/api/stats/intent")
+async def intent_stats() -> dict:
+    """Intent router decisions (per intent and source) and decision latency."""
+    return intent.stats()
 
 
-@app.post("/api/reset")
-async def reset_session() -> dict:
-    """Reset server-side caches if needed."""
-    return {"status": "ok", "message": "Session reset."}
+@app.get("/api/stats/single-flight")
+async def single_flight_stats() -> dict:
+    """How often concurrent identical tree builds / LLM calls were coalesced."""
+    return single_flight.stats()
 
 
 # ── Serve frontend ─────────────────────────────────────────────────────
@@ -134,14 +182,198 @@ if os.path.isdir(FRONTEND_DIR):
 
 # ── Internal helpers ───────────────────────────────────────────────────
 
-def _is_learning_request(msg: str) -> bool:
-    lower = msg.lower().strip()
-    triggers = [
-        "what is", "explain", "teach me", "learn:", "learn about",
-        "how does", "i want to learn", "help me understand",
-        "tell me about", "break down",
-    ]
-    return any(lower.startswith(t) or t in lower for t in triggers)
+async def _chat_turn(req: ChatRequest, user_msg: str) -> dict:
+    """Run one turn, loading and saving server-side session state when enabled."""
+    if not (config.SESSION_STORE_ENABLED and req.session_id):
+        if req.session_version is not None:
+            _stored_context(req)  # nothing to resolve the version against: 409, the client resends its context
+        return await _run_turn(req.session_id, user_msg, req.session_context or SessionContext())
+
+    async with session_store.lock(req.session_id):
+        if req.session_version is None:
+            ctx = req.session_context or SessionContext()
+        else:
+            ctx = _stored_context(req)
+        result = await _run_turn(req.session_id, user_msg, ctx)
+        changed = _apply_session_update(ctx, result.get("session_update"))
+        if req.session_version is not None:
+            # Delta mode: the client already holds everything that did not change
+            result.pop("session_update", None)
+            if changed:
+                result["session_update"] = changed
+        result["session_version"] = session_store.put(req.session_id, ctx.model_dump())
+    return result
+
+
+async def _run_turn(session_id: str, user_msg: str, ctx: SessionContext) -> dict:
+    prefetch.touch(session_id)
+    # Calls a handler fans out (and the tasks it starts) share this budget
+    llm_client.set_request_budget(config.TURN_LLM_CONCURRENCY)
+    result = await _route(user_msg, ctx)
+    _prefetch_next_turn(session_id, ctx, result)
+    return result
+
+
+def _stored_context(req: ChatRequest) -> SessionContext:
+    """The stored session for req, or 409 if it is unknown or at another version."""
+    stored = session_store.get(req.session_id) if config.SESSION_STORE_ENABLED and req.session_id else None
+    if stored is None:
+        raise HTTPException(409, {"error": "unknown_session", "session_version": None})
+    version, state = stored
+    if version != req.session_version:
+        raise HTTPException(409, {"error": "version_conflict", "session_version": version})
+    return SessionContext(**state)
+
+
+def _apply_session_update(ctx: SessionContext, update: Optional[dict]) -> dict:
+    """Apply a handler's session_update to ctx; return only the fields that changed."""
+    changed: dict = {}
+    for field, value in (update or {}).items():
+        if field in SessionContext.model_fields and getattr(ctx, field) != value:
+            setattr(ctx, field, value)
+            changed[field] = value
+    if update and update.get("is_new_tree"):
+        changed["is_new_tree"] = True
+        changed["topic"] = update["topic"]
+        if update["topic"] not in ctx.all_topics:
+            ctx.all_topics.append(update["topic"])
+    return changed
+
+
+async def _route(user_msg: str, ctx: SessionContext) -> dict:
+    """Dispatch a message to the handler for the current teaching state."""
+    # If waiting for synthesis answer → validate it
+    if ctx.waiting_for_synthesis:
+        return await _handle_synthesis_answer(user_msg, ctx)
+
+    # If we have a teaching flow going and haven't explained yet
+    if ctx.tree and not ctx.explained_current and ctx.current_index < len(ctx.teaching_order):
+        return await _explain_current_concept(ctx)
+
+    # Classify locally (rules, then prototype embeddings) before any LLM call
+    decision = await asyncio.to_thread(intent.classify, user_msg)
+    # Only a learning trigger names a topic; an embedding "learn" gets a canned prompt below
+    if decision["intent"] == "learn" and decision["source"] == "rule":
+        topic = _extract_topic(user_msg)
+        return await _start_learning(topic, ctx)
+
+    # "yes/ready/next" to proceed
+    in_flow = bool(ctx.tree) and ctx.current_index < len(ctx.teaching_order)
+    if decision["intent"] == "continue" and in_flow:
+        return await _ask_synthesis_or_next(ctx)
+
+    # Common non-learning intents get a templated reply
+    concept = None
+    if in_flow:
+        info = ctx.teaching_order[ctx.current_index]
+        concept = info["topic"] if isinstance(info, dict) else info
+    canned = intent.canned_response(decision["intent"], concept)
+    if canned is not None:
+        return {"response": _Reply(canned).text, "type": "message"}
+
+    # Fallback: general response
+    response = await llm_client.acall_llm(
+        user_msg,
+        system_prompt=(
+            "You are a friendly learning assistant focused on recall-based learning. "
+            "If the user wants to learn a topic, tell them to type 'Learn: [topic name]'. "
+            "Keep responses brief and helpful."
+        ),
+        stream=True,
+    )
+    return {"response": response, "type": "message"}
+
+
+class _Reply:
+    """
+    Builds a response text. Static pieces are echoed to the token stream
+    as they are added; generated pieces stream their own tokens.
+    """
+
+    def __init__(self, text: str = ""):
+        self.text = ""
+        self.add(text)
+
+    def add(self, text: str) -> None:
+        self.text += text
+        llm_client.emit_token(text)
+
+    async def stream(self, call: Awaitable[str]) -> str:
+        """Append the result of a call that streams its own tokens."""
+        text = await call
+        self.text += text
+        return text
+
+    async def replay(self, task: "asyncio.Task[str]") -> str:
+        """Append (and echo) the result of a call started silently with _speculate."""
+        text = await task
+        self.add(text)
+        return text
+
+
+def _speculate(call: Awaitable[str]) -> "asyncio.Task[str]":
+    """
+    Start a call alongside others in this turn without streaming its tokens;
+    the handler replays the result in order, or cancels it if unneeded.
+    """
+    async def _run() -> str:
+        llm_client.set_token_sink(None)
+        return await call
+
+    return asyncio.create_task(_run())
+
+
+async def _explain(concept: str, known: list[str]) -> str:
+    """Explain a concept, preferring a prefetched explanation."""
+    text = await prefetch.claim("explain", concept, known)
+    if text is None:
+        return await explainer.explain_concept(concept, known)
+    llm_client.emit_token(text)
+    return text
+
+
+async def _synthesis_question(concept: str, prerequisites: list[str], difficulty: str) -> str:
+    """Generate a synthesis question, preferring a prefetched one."""
+    text = await prefetch.claim("synthesis", concept, prerequisites)
+    if text is None:
+        return await synthesis.generate_synthesis_question(concept, prerequisites, difficulty)
+    llm_client.emit_token(text)
+    return text
+
+
+def _prefetch_next_turn(session_id: str, ctx: SessionContext, result: dict) -> None:
+    """
+    Speculatively start the LLM calls the next turn will need: the synthesis
+    question for the concept just explained, and the next concept's explanation.
+    """
+    update = result.get("session_update") or {}
+    order = update.get("teaching_order", ctx.teaching_order)
+    index = update.get("current_index", ctx.current_index)
+    explained = update.get("explained_current", ctx.explained_current)
+    waiting = update.get("waiting_for_synthesis", ctx.waiting_for_synthesis)
+    if not explained or index >= len(order):
+        return
+
+    topics = [(t["topic"] if isinstance(t, dict) else t) for t in order]
+    concept = topics[index]
+
+    # "Makes sense" → synthesis question (the very first concept skips it)
+    prerequisites = topics[max(0, index - 2):index + 1]
+    if not waiting and not (index == 0 and len(prerequisites) <= 1):
+        prefetch.schedule(
+            session_id, "synthesis", concept, prerequisites,
+            lambda: synthesis.generate_synthesis_question(
+                concept, prerequisites, config.SYNTHESIS_DIFFICULTY,
+            ),
+        )
+
+    # Passing (or moving on) → explanation of the next concept
+    if index + 1 < len(topics):
+        next_concept, known = topics[index + 1], topics[:index + 1]
+        prefetch.schedule(
+            session_id, "explain", next_concept, known,
+            lambda: explainer.explain_concept(next_concept, known),
+        )
 
 
 def _extract_topic(msg: str) -> str:
@@ -160,22 +392,36 @@ def _extract_topic(msg: str) -> str:
     return topic.rstrip("?.!").strip()
 
 
-def _start_learning(topic: str, ctx: SessionContext) -> dict:
+async def _start_learning(topic: str, ctx: SessionContext) -> dict:
     """Build tree, set up teaching flow, teach first concept."""
-    # Build prerequisite tree
-    tree = prereq_mod.build_prerequisite_tree(topic, max_depth=config.MAX_TREE_DEPTH)
-
-    # Get mastered concepts from cache to skip them
-    mastered_set = {c["concept"].lower() for c in cache.get_mastered_concepts()}
+    # Reuse a cached tree for the same or a semantically equivalent topic,
+    # otherwise build one (siblings expanded concurrently)
+    match = await asyncio.to_thread(prereq_mod.find_cached_tree, topic)
+    if match:
+        tree = match["tree"]
+    else:
+        tree = await prereq_mod.build_prerequisite_tree_concurrent(
+            topic,
+            max_depth=config.MAX_TREE_DEPTH,
+            max_concurrency=config.TREE_BUILD_CONCURRENCY,
+        )
+    data: dict = {}
+    if match and cache.normalize_topic(match["topic"]) != cache.normalize_topic(topic):
+        data = {"matched_topic": match["topic"], "match_similarity": round(match["similarity"], 3)}
+
+    # Skip concepts already mastered (in-memory set, no table scan)
+    mastered_set = await asyncio.to_thread(cache.mastered_keys)
     full_order = prereq_mod.tree_to_teaching_order(tree)
-    teaching_order = [t for t in full_order if t["topic"].lower() not in mastered_set]
+    teaching_order = [t for t in full_order if cache.normalize_topic(t["topic"]) not in mastered_set]
+    tree_json = tree.to_dict()  # nested form only for the client
 
     if not teaching_order:
         return {
             "response": f"🎉 You've already mastered all prerequisites for **{topic}**! Ask me anything about it.",
             "type": "message",
+            "data": data or None,
             "session_update": {
-                "tree": tree,
+                "tree": tree_json,
                 "is_new_tree": True,
                 "topic": topic,
                 "teaching_order": teaching_order,
@@ -190,16 +436,19 @@ def _start_learning(topic: str, ctx: SessionContext) -> dict:
     # Build response
     total = len(teaching_order)
     first_topic = teaching_order[0]["topic"]
-    response = (
+    reply = _Reply(
         f"Great! Let me break down **{topic}** into building blocks.\n\n"
         f"```\n{tree_text}\n```\n\n"
         f"We'll learn **{total} concepts**, starting with the simplest: **{first_topic}**.\n\n"
     )
+    if data:
+        reply.add(f"_(Using my map for **{data['matched_topic']}**, the closest topic I've already broken down.)_\n\n")
 
     # Explain the first concept immediately
     known = []
-    explanation = explainer.explain_concept(first_topic, known)
-    response += f"**{first_topic}**\n\n{explanation}\n\nDoes this make sense? Ready to continue?"
+    reply.add(f"**{first_topic}**\n\n")
+    explanation = await reply.stream(_explain(first_topic, known))
+    reply.add("\n\nDoes this make sense? Ready to continue?")
 
     # Build turn data for conversation.md tracking
     concept_id = first_topic.lower().replace(" ", "_")
@@ -212,10 +461,10 @@ def _start_learning(topic: str, ctx: SessionContext) -> dict:
     }
 
     return {
-        "response": response,
+        "response": reply.text,
         "type": "tree",
         "session_update": {
-            "tree": tree,
+            "tree": tree_json,
             "is_new_tree": True,
             "topic": topic,
             "teaching_order": teaching_order,
@@ -225,11 +474,11 @@ def _start_learning(topic: str, ctx: SessionContext) -> dict:
             "waiting_for_synthesis": False,
         },
         "turn_data": turn_data,
-        "data": {"tree": tree, "teaching_order": [t["topic"] for t in teaching_order]},
+        "data": {"teaching_order": [t["topic"] for t in teaching_order], **data},
     }
 
 
-def _explain_current_concept(ctx: SessionContext) -> dict:
+async def _explain_current_concept(ctx: SessionContext) -> dict:
     """Explain the concept at current_index."""
     index = ctx.current_index
     concept_info = ctx.teaching_order[index]
@@ -240,11 +489,13 @@ def _explain_current_concept(ctx: SessionContext) -> dict:
         for t in ctx.teaching_order[:index]
     ]
 
-    explanation = explainer.explain_concept(concept, known)
+    reply = _Reply(f"**{concept}**\n\n")
+    explanation = await reply.stream(_explain(concept, known))
+    reply.add("\n\nDoes this make sense?")
     concept_id = concept.lower().replace(" ", "_")
 
     return {
-        "response": f"**{concept}**\n\n{explanation}\n\nDoes this make sense?",
+        "response": reply.text,
         "type": "explanation",
         "session_update": {
             "explained_current": True,
@@ -256,7 +507,7 @@ def _explain_current_concept(ctx: SessionContext) -> dict:
     }
 
 
-def _ask_synthesis_or_next(ctx: SessionContext) -> dict:
+async def _ask_synthesis_or_next(ctx: SessionContext) -> dict:
     """After user confirms understanding, ask synthesis Q or move on."""
     idx = ctx.current_index
     teaching_order = ctx.teaching_order
@@ -283,11 +534,13 @@ def _ask_synthesis_or_next(ctx: SessionContext) -> dict:
         next_info = teaching_order[new_index]
         next_concept = next_info["topic"] if isinstance(next_info, dict) else next_info
         known = [(t["topic"] if isinstance(t, dict) else t) for t in teaching_order[:new_index]]
-        explanation = explainer.explain_concept(next_concept, known)
+        reply = _Reply(f"✅ **{concept}** — got it!\n\n---\n\n**{next_concept}**\n\n")
+        explanation = await reply.stream(_explain(next_concept, known))
+        reply.add("\n\nDoes this make sense?")
         next_concept_id = next_concept.lower().replace(" ", "_")
 
         return {
-            "response": f"✅ **{concept}** — got it!\n\n---\n\n**{next_concept}**\n\n{explanation}\n\nDoes this make sense?",
+            "response": reply.text,
             "type": "explanation",
             "session_update": {
                 "current_index": new_index,
@@ -302,12 +555,14 @@ def _ask_synthesis_or_next(ctx: SessionContext) -> dict:
         }
 
     # Ask synthesis question
-    question = synthesis.generate_synthesis_question(
+    reply = _Reply(f"Now let's test your understanding of **{concept}**.\n\n")
+    question = await reply.stream(_synthesis_question(
         concept, prerequisites, config.SYNTHESIS_DIFFICULTY,
-    )
+    ))
+    reply.add("\n\nTake your time — explain your reasoning!")
 
     return {
-        "response": f"Now let's test your understanding of **{concept}**.\n\n{question}\n\nTake your time — explain your reasoning!",
+        "response": reply.text,
         "type": "synthesis_question",
         "session_update": {
             "waiting_for_synthesis": True,
@@ -321,7 +576,7 @@ def _ask_synthesis_or_next(ctx: SessionContext) -> dict:
     }
 
 
-def _handle_synthesis_answer(answer: str, ctx: SessionContext) -> dict:
+async def _handle_synthesis_answer(answer: str, ctx: SessionContext) -> dict:
     """Validate user's synthesis answer."""
     idx = ctx.current_index
     teaching_order = ctx.teaching_order
@@ -335,18 +590,34 @@ def _handle_synthesis_answer(answer: str, ctx: SessionContext) -> dict:
         for i in range(max(0, idx - 2), idx + 1)
     ]
 
-    result = validator.validate_answer(ctx.current_question, answer, prerequisites)
+    # The next concept's explanation is needed after a pass or a final
+    # failed attempt; start it alongside validation, discard it after a hint
+    next_concept = next_explanation = None
+    if idx + 1 < len(teaching_order):
+        next_info = teaching_order[idx + 1]
+        next_concept = next_info["topic"] if isinstance(next_info, dict) else next_info
+        known = [(t["topic"] if isinstance(t, dict) else t) for t in teaching_order[:idx + 1]]
+        next_explanation = _speculate(_explain(next_concept, known))
+
+    try:
+        result = await validator.validate_answer(ctx.current_question, answer, prerequisites)
+    except BaseException:
+        if next_explanation:
+            next_explanation.cancel()
+        raise
     attempt_count = ctx.attempt_count + 1
+    if next_explanation and not result["passed"] and attempt_count < config.SYNTHESIS_MAX_ATTEMPTS:
+        next_explanation.cancel()
 
     if result["passed"]:
         # ✅ Passed — record mastery, move on
         cache.track_mastery(concept, answer[:500], result.get("insight", ""))
         new_index = idx + 1
 
-        response = f"**Excellent!** {result['feedback']}\n\n✅ You've mastered **{concept}** (Score: {result['score']}/100)\n\n"
+        reply = _Reply(f"**Excellent!** {result['feedback']}\n\n✅ You've mastered **{concept}** (Score: {result['score']}/100)\n\n")
 
         if result.get("insight"):
-            response += f"💡 Key insight: *{result['insight']}*\n\n"
+            reply.add(f"💡 Key insight: *{result['insight']}*\n\n")
 
         session_update = {
             "waiting_for_synthesis": False,
@@ -364,31 +635,28 @@ def _handle_synthesis_answer(answer: str, ctx: SessionContext) -> dict:
 
         if new_index >= len(teaching_order):
             complete = _learning_complete(ctx.target_topic, new_index, teaching_order)
-            response += complete["response"]
+            reply.add(complete["response"])
             session_update.update(complete.get("session_update", {}))
             return {
-                "response": response,
+                "response": reply.text,
                 "type": "feedback",
                 "data": {"passed": True, "score": result["score"]},
                 "session_update": session_update,
                 "turn_data": turn_data,
             }
 
-        # Explain next concept
-        response += "---\n\n"
-        next_info = teaching_order[new_index]
-        next_concept = next_info["topic"] if isinstance(next_info, dict) else next_info
-        known = [(t["topic"] if isinstance(t, dict) else t) for t in teaching_order[:new_index]]
-        explanation = explainer.explain_concept(next_concept, known)
+        # Explain next concept (already generated alongside validation)
+        reply.add(f"---\n\n**{next_concept}**\n\n")
+        explanation = await reply.replay(next_explanation)
         session_update["explained_current"] = True
-        response += f"**{next_concept}**\n\n{explanation}\n\nDoes this make sense?"
+        reply.add("\n\nDoes this make sense?")
 
         next_concept_id = next_concept.lower().replace(" ", "_")
         turn_data["concepts"].append(next_concept_id)
         turn_data["explanation"] = explanation
 
         return {
-            "response": response,
+            "response": reply.text,
             "type": "feedback",
             "data": {"passed": True, "score": result["score"]},
             "session_update": session_update,
@@ -407,17 +675,17 @@ def _handle_synthesis_answer(answer: str, ctx: SessionContext) -> dict:
         if attempt_count >= config.SYNTHESIS_MAX_ATTEMPTS:
             # Too many attempts — explain and move on
             new_index = idx + 1
-            response = f"{result['feedback']}\n\nLet me explain the key connections:\n\n"
+            reply = _Reply(f"{result['feedback']}\n\nLet me explain the key connections:\n\n")
 
             if result["missing"]:
-                from modules.llm_client import call_llm
-                explanation = call_llm(
+                await reply.stream(llm_client.acall_llm(
                     f"Briefly explain how {', '.join(result['missing'])} connect in the context of {concept}. "
-                    f"Prerequisites: {', '.join(prerequisites)}. 3-4 sentences max."
-                )
-                response += explanation + "\n\n"
+                    f"Prerequisites: {', '.join(prerequisites)}. 3-4 sentences max.",
+                    stream=True,
+                ))
+                reply.add("\n\n")
 
-            response += "Let's move forward — we can revisit this later.\n\n"
+            reply.add("Let's move forward — we can revisit this later.\n\n")
 
             session_update = {
                 "waiting_for_synthesis": False,
@@ -426,17 +694,14 @@ def _handle_synthesis_answer(answer: str, ctx: SessionContext) -> dict:
                 "attempt_count": 0,
             }
 
-            if new_index < len(teaching_order):
-                response += "---\n\n"
-                next_info = teaching_order[new_index]
-                next_concept = next_info["topic"] if isinstance(next_info, dict) else next_info
-                known = [(t["topic"] if isinstance(t, dict) else t) for t in teaching_order[:new_index]]
-                expl = explainer.explain_concept(next_concept, known)
+            if next_explanation:
+                reply.add(f"---\n\n**{next_concept}**\n\n")
+                await reply.replay(next_explanation)
                 session_update["explained_current"] = True
-                response += f"**{next_concept}**\n\n{expl}\n\nDoes this make sense?"
+                reply.add("\n\nDoes this make sense?")
 
             return {
-                "response": response,
+                "response": reply.text,
                 "type": "feedback",
                 "data": {"passed": False, "score": result["score"]},
                 "session_update": session_update,
@@ -444,19 +709,15 @@ def _handle_synthesis_answer(answer: str, ctx: SessionContext) -> dict:
             }
         else:
             # Give a hint
-            hint = ""
+            reply = _Reply(f"{result['feedback']}\n\n💡 **Hint:** ")
             if result["missing"]:
-                hint = validator.generate_hint(result["missing"], prerequisites)
+                await reply.stream(validator.generate_hint(result["missing"], prerequisites))
 
             remaining = config.SYNTHESIS_MAX_ATTEMPTS - attempt_count
-            response = (
-                f"{result['feedback']}\n\n"
-                f"💡 **Hint:** {hint}\n\n"
-                f"Try again! ({remaining} attempt{'s' if remaining != 1 else ''} remaining)"
-            )
+            reply.add(f"\n\nTry again! ({remaining} attempt{'s' if remaining != 1 else ''} remaining)")
 
             return {
-                "response": response,
+                "response": reply.text,
                 "type": "feedback",
                 "data": {"passed": False, "score": result["score"]},
                 "session_update": {
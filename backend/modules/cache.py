@@ -1,33 +1,265 @@
 """
 SQLite Caching Layer — persists embeddings, prerequisite trees,
 synthesis questions, and concept mastery to avoid redundant computation.
+Also holds the structured memory store behind memory.md.
 """
 
+import atexit
+import functools
 import hashlib
 import json
+import os
+import pathlib
 import pickle
+import queue
+import re
 import sqlite3
+import threading
 import time
-from typing import Any, Optional
+from collections import Counter
+from contextlib import contextmanager
+from typing import Any, Iterable, Iterator, Optional
 
-from config import config
-
-
-def _connect() -> sqlite3.Connection:
-    conn = sqlite3.connect(config.CACHE_DB, check_same_thread=False)
-    conn.execute("PRAGMA journal_mode=WAL")
-    return conn
-
-
-_conn: sqlite3.Connection | None = None
+import numpy as np
 
-
-def _db() -> sqlite3.Connection:
-    global _conn
-    if _conn is None:
-        _conn = _connect()
-        _create_tables(_conn)
-    return _conn
+from config import config
+from modules.flat_tree import FlatTree
+
+# Bumped whenever stored data changes format; see _migrate()
+_SCHEMA_VERSION = 3
+
+
+# Connections: one writer (serialized by _write_lock) plus a pool of
+# read-only connections, so reads from concurrent requests run in parallel
+# under WAL and never share a transaction with a writer.
+_writer: sqlite3.Connection | None = None
+_write_lock = threading.RLock()
+_readers: "queue.SimpleQueue[sqlite3.Connection]" = queue.SimpleQueue()
+_reader_count = 0
+_init_lock = threading.Lock()
+
+
+def _tune(conn: sqlite3.Connection) -> None:
+    conn.execute("PRAGMA busy_timeout=5000")
+    conn.execute(f"PRAGMA cache_size=-{config.SQLITE_CACHE_KB}")
+    conn.execute(f"PRAGMA mmap_size={config.SQLITE_MMAP_BYTES}")
+
+
+def _writer_conn() -> sqlite3.Connection:
+    global _writer
+    if _writer is None:
+        with _init_lock:
+            if _writer is None:
+                conn = sqlite3.connect(config.CACHE_DB, check_same_thread=False)
+                conn.execute("PRAGMA journal_mode=WAL")
+                conn.execute("PRAGMA synchronous=NORMAL")
+                conn.execute("PRAGMA temp_store=MEMORY")
+                _tune(conn)
+                _create_tables(conn)
+                _writer = conn
+    return _writer
+
+
+@contextmanager
+def _write() -> Iterator[sqlite3.Connection]:
+    """
+    The writer connection, in a transaction; commits on success, rolls back
+    on error. Queued writes are committed first, in their own transaction,
+    so ordering is preserved and a failing caller cannot roll them back.
+    """
+    with _write_lock:
+        conn = _writer_conn()
+        _commit_queue(conn)
+        try:
+            yield conn
+            conn.commit()
+        except BaseException:
+            conn.rollback()
+            raise
+
+
+# ── Group commit ──────────────────────────────────────────────────────
+# Small writes are queued and committed together by a background thread
+# every WRITE_BATCH_MS (or as soon as WRITE_BATCH_MAX are pending), so a
+# burst of cache writes costs one WAL sync instead of one each. Writes
+# name the rows they touch (`keys`); a read first flushes the queue only
+# if a pending write touches one of its rows (or its whole table), so
+# callers always see their own writes without flushing on every read.
+
+# (sql, params, executemany, durable, marks); marks are the op's (table, key) entries
+_queue: list[tuple[str, Any, bool, bool, tuple]] = []
+_queue_cond = threading.Condition()
+_pending_rows: Counter = Counter()   # (table, key) → queued ops; key None = the whole table
+_flusher: threading.Thread | None = None
+_flusher_idle = False                 # waiting for the queue to become non-empty
+
+
+@functools.lru_cache(maxsize=256)
+def _tables(sql: str) -> frozenset:
+    return frozenset(re.findall(r"\b(?:FROM|INTO|UPDATE|JOIN)\s+(\w+)", sql, re.IGNORECASE))
+
+
+def _enqueue(
+    sql: str, params: Any = (), many: bool = False, durable: bool = False, keys: Optional[Iterable] = None,
+) -> None:
+    """
+    Queue a write for the next group commit. durable=True forces
+    synchronous=FULL for its batch. `keys` are the row keys it writes (the
+    ones reads pass to _read); None means any row, () means no read depends
+    on it (e.g. hit counters).
+    """
+    global _flusher
+    tables = _tables(sql)
+    marks = tuple((t, None) for t in tables) if keys is None else tuple((t, k) for t in tables for k in keys)
+    with _queue_cond:
+        _queue.append((sql, params, many, durable, marks))
+        _pending_rows.update(marks)
+        if _flusher is None or not _flusher.is_alive():
+            _flusher = threading.Thread(target=_flush_loop, name="cache-writer", daemon=True)
+            _flusher.start()
+        # Wake an idle writer; one already timing a batch is only cut short by a full queue
+        if (_flusher_idle and len(_queue) == 1) or len(_queue) >= config.WRITE_BATCH_MAX:
+            _queue_cond.notify()
+
+
+def _commit_queue(conn: sqlite3.Connection) -> None:
+    """
+    Commit every queued write in one transaction (caller holds _write_lock).
+    A statement that is itself invalid is dropped; if the commit fails, the
+    whole batch goes back on the queue for the next flush.
+    """
+    with _queue_cond:
+        batch = _queue[:]
+        del _queue[:]
+    if not batch:
+        return
+    durable = any(op[3] for op in batch)
+    try:
+        if durable:
+            conn.execute("PRAGMA synchronous=FULL")
+        for sql, params, many, _, _ in batch:
+            try:
+                (conn.executemany if many else conn.execute)(sql, params)
+            except sqlite3.OperationalError:
+                raise  # locked / disk I/O: retry the batch later
+            except sqlite3.Error as e:
+                print(f"[CACHE] Dropped queued write ({e}): {sql.split()[0:4]}")
+        conn.commit()
+    except BaseException:
+        conn.rollback()
+        with _queue_cond:
+            _queue[:0] = batch
+        raise
+    finally:
+        if durable:
+            conn.execute("PRAGMA synchronous=NORMAL")
+    # Only once committed: until then, reads of these tables wait on _write_lock
+    with _queue_cond:
+        _pending_rows.subtract(m for op in batch for m in op[4])
+        for m in [m for m, n in _pending_rows.items() if n <= 0]:
+            del _pending_rows[m]
+
+
+def _flush_loop() -> None:
+    global _flusher_idle
+    while True:
+        with _queue_cond:
+            while not _queue:
+                _flusher_idle = True
+                _queue_cond.wait()
+            _flusher_idle = False
+            if len(_queue) < config.WRITE_BATCH_MAX:
+                _queue_cond.wait(config.WRITE_BATCH_MS / 1000)  # let the batch fill
+        try:
+            flush()
+        except Exception as e:
+            print(f"[CACHE] Group commit failed, retrying: {e}")
+            time.sleep(1)
+
+
+def flush() -> None:
+    """
+    Commit every queued write now (durably, if any is marked durable). Also
+    waits out a batch the background writer has taken but not yet committed.
+    """
+    if _queue or _pending_rows:
+        with _write_lock:
+            _commit_queue(_writer_conn())
+
+
+atexit.register(flush)
+
+
+def _conflicts(sql: str, keys: Optional[Iterable]) -> bool:
+    """Whether a queued (or drained, uncommitted) write touches rows this read may return."""
+    with _queue_cond:
+        if not _pending_rows:
+            return False
+        tables = _tables(sql)
+        if keys is None:
+            return any(t in tables for t, _ in _pending_rows)
+        return any((t, None) in _pending_rows or any((t, k) in _pending_rows for k in keys) for t in tables)
+
+
+def _flush_if_pending(sql: str, keys: Optional[Iterable] = None) -> None:
+    if _conflicts(sql, keys):
+        try:
+            flush()
+        except sqlite3.Error as e:
+            print(f"[CACHE] Reading before queued writes could commit: {e}")
+
+
+@contextmanager
+def _reader() -> Iterator[sqlite3.Connection]:
+    """A pooled read-only connection (opened lazily, up to SQLITE_READ_POOL)."""
+    global _reader_count
+    _writer_conn()  # the schema must exist before a read-only open
+    try:
+        conn = _readers.get_nowait()
+    except queue.Empty:
+        with _init_lock:
+            grow = _reader_count < config.SQLITE_READ_POOL
+            if grow:
+                _reader_count += 1
+        if grow:
+            uri = pathlib.Path(os.path.abspath(config.CACHE_DB)).as_uri() + "?mode=ro"
+            conn = sqlite3.connect(uri, uri=True, check_same_thread=False)
+            _tune(conn)
+        else:
+            conn = _readers.get()
+    try:
+        yield conn
+    finally:
+        _readers.put(conn)
+
+
+def _read(sql: str, params: tuple = (), keys: Optional[Iterable] = None) -> list[tuple]:
+    """Rows for `sql`; `keys` are the row keys it reads (None: any row of its tables)."""
+    _flush_if_pending(sql, keys)
+    with _reader() as conn:
+        return conn.execute(sql, params).fetchall()
+
+
+def _read_one(sql: str, params: tuple = (), keys: Optional[Iterable] = None) -> Optional[tuple]:
+    _flush_if_pending(sql, keys)
+    with _reader() as conn:
+        return conn.execute(sql, params).fetchone()
+
+
+def close() -> None:
+    """Flush queued writes and close every connection; the next call reopens against config.CACHE_DB."""
+    global _writer, _reader_count
+    flush()
+    with _write_lock, _init_lock:
+        while True:
+            try:
+                _readers.get_nowait().close()
+            except queue.Empty:
+                break
+        _reader_count = 0
+        if _writer is not None:
+            _writer.close()
+            _writer = None
 
 
 def _create_tables(conn: sqlite3.Connection) -> None:
@@ -51,6 +283,23 @@ def _create_tables(conn: sqlite3.Connection) -> None:
             expires_at      INTEGER NOT NULL
         );
 
+        CREATE TABLE IF NOT EXISTS prerequisite_node_cache (
+            topic_key      TEXT PRIMARY KEY,
+            prerequisites  TEXT,
+            explanation    TEXT,
+            created_at     INTEGER NOT NULL,
+            expires_at     INTEGER NOT NULL
+        );
+
+        CREATE TABLE IF NOT EXISTS explanation_cache (
+            cache_key      TEXT PRIMARY KEY,
+            concept        TEXT NOT NULL,
+            explanation    TEXT NOT NULL,
+            hits           INTEGER DEFAULT 0,
+            created_at     INTEGER NOT NULL,
+            expires_at     INTEGER NOT NULL
+        );
+
         CREATE TABLE IF NOT EXISTS synthesis_cache (
             concept        TEXT,
             prerequisites  TEXT,
@@ -70,91 +319,495 @@ def _create_tables(conn: sqlite3.Connection) -> None:
             synthesis_answer TEXT,
             insights       TEXT,
             time_to_master INTEGER DEFAULT 0,
+            concept_key    TEXT,
             PRIMARY KEY (user_id, concept)
         );
 
         CREATE INDEX IF NOT EXISTS idx_emb_accessed
             ON embedding_cache(last_accessed);
+
+        CREATE TABLE IF NOT EXISTS llm_response_cache (
+            cache_key      TEXT PRIMARY KEY,
+            family         TEXT NOT NULL,
+            response       TEXT NOT NULL,
+            created_at     INTEGER NOT NULL,
+            expires_at     INTEGER NOT NULL
+        );
+
+        CREATE TABLE IF NOT EXISTS flight_leases (
+            key            TEXT PRIMARY KEY,
+            owner          TEXT NOT NULL,
+            expires_at     REAL NOT NULL
+        );
+
+        CREATE TABLE IF NOT EXISTS validation_verdicts (
+            id             INTEGER PRIMARY KEY AUTOINCREMENT,
+            question       TEXT NOT NULL,
+            answer         TEXT NOT NULL,
+            prerequisites  TEXT NOT NULL,
+            passed         INTEGER NOT NULL,
+            score          INTEGER NOT NULL,
+            missing        TEXT NOT NULL,
+            created_at     INTEGER NOT NULL,
+            weight         REAL NOT NULL DEFAULT 1
+        );
+
+        CREATE TABLE IF NOT EXISTS memory_profile (
+            field          TEXT PRIMARY KEY,
+            value          TEXT NOT NULL,
+            position       INTEGER NOT NULL
+        );
+
+        CREATE TABLE IF NOT EXISTS memory_topics (
+            topic_key      TEXT PRIMARY KEY,
+            concept        TEXT NOT NULL,
+            mastered_at    INTEGER NOT NULL
+        );
+
+        CREATE TABLE IF NOT EXISTS memory_tree_nodes (
+            position       INTEGER PRIMARY KEY,
+            depth          INTEGER NOT NULL,
+            topic          TEXT NOT NULL
+        );
+
+        CREATE TABLE IF NOT EXISTS memory_insights (
+            id             INTEGER PRIMARY KEY AUTOINCREMENT,
+            concept        TEXT NOT NULL,
+            answer         TEXT NOT NULL,
+            insight        TEXT NOT NULL,
+            created_at     INTEGER NOT NULL
+        );
+
+        CREATE TABLE IF NOT EXISTS memory_meta (
+            key            TEXT PRIMARY KEY,
+            value          TEXT NOT NULL
+        );
         """
     )
     conn.commit()
+    _migrate(conn)
+
+
+def _migrate(conn: sqlite3.Connection) -> None:
+    version = conn.execute("PRAGMA user_version").fetchone()[0]
+    if version < 1:
+        _migrate_pickled_embeddings(conn)
+    if version < 2:
+        _migrate_mastery_keys(conn)
+    if version < 3:
+        _migrate_verdict_weights(conn)
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_mastery_key ON concept_mastery(user_id, concept_key)")
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_mastery_user ON concept_mastery(user_id)")  # per-user max(rowid)
+    if version != _SCHEMA_VERSION:
+        conn.execute(f"PRAGMA user_version={_SCHEMA_VERSION}")
+        conn.commit()
+
+
+def _migrate_pickled_embeddings(conn: sqlite3.Connection) -> None:
+    """v0 → v1: embeddings were pickled Python lists; rewrite them as float32 blobs."""
+    updates, broken = [], []
+    for text_hash, blob in conn.execute("SELECT text_hash, embedding FROM embedding_cache"):
+        try:
+            updates.append((_encode_embedding(pickle.loads(blob)), text_hash))
+        except Exception:
+            broken.append((text_hash,))
+    conn.executemany("UPDATE embedding_cache SET embedding=? WHERE text_hash=?", updates)
+    conn.executemany("DELETE FROM embedding_cache WHERE text_hash=?", broken)
+    conn.commit()
+
+
+def _migrate_mastery_keys(conn: sqlite3.Connection) -> None:
+    """v1 → v2: add the normalized concept_key column used by the mastered set."""
+    columns = {row[1] for row in conn.execute("PRAGMA table_info(concept_mastery)")}
+    if "concept_key" not in columns:
+        conn.execute("ALTER TABLE concept_mastery ADD COLUMN concept_key TEXT")
+    rows = conn.execute("SELECT user_id, concept FROM concept_mastery WHERE concept_key IS NULL").fetchall()
+    conn.executemany(
+        "UPDATE concept_mastery SET concept_key=? WHERE user_id=? AND concept=?",
+        [(normalize_topic(concept), user_id, concept) for user_id, concept in rows],
+    )
+    conn.commit()
+
+
+def _migrate_verdict_weights(conn: sqlite3.Connection) -> None:
+    """v2 → v3: add the sampling weight column to validation_verdicts."""
+    columns = {row[1] for row in conn.execute("PRAGMA table_info(validation_verdicts)")}
+    if "weight" not in columns:
+        conn.execute("ALTER TABLE validation_verdicts ADD COLUMN weight REAL NOT NULL DEFAULT 1")
+    conn.commit()
 
 
 # ── Embedding cache ────────────────────────────────────────────────────
 
+_SQL_CHUNK = 500  # stay well under SQLite's host-parameter limit
+
+# Write-behind access tracking: text_hash → last access time, flushed periodically
+_pending_access: dict[str, int] = {}
+_last_access_flush: float = 0.0
+_access_lock = threading.Lock()  # request threads record accesses while a flush swaps the dict
+
+# Approximate (rows, bytes) in embedding_cache; None until first measured
+_emb_usage: tuple[int, int] | None = None
+
+
+def _text_hash(text: str) -> str:
+    return hashlib.sha256(text.encode()).hexdigest()
+
+
+def _encode_embedding(embedding: Any) -> bytes:
+    """Raw little-endian float32 bytes."""
+    return np.asarray(embedding, dtype="<f4").tobytes()
+
+
+def _decode_embedding(blob: bytes) -> np.ndarray:
+    """Zero-copy (read-only) view over a stored float32 blob."""
+    return np.frombuffer(blob, dtype="<f4")
+
+
 def get_cached_embedding(text: str, model_name: str = "all-MiniLM-L6-v2") -> Optional[Any]:
-    text_hash = hashlib.sha256(text.encode()).hexdigest()
-    row = _db().execute(
-        "SELECT embedding FROM embedding_cache WHERE text_hash=? AND model_name=?",
-        (text_hash, model_name),
-    ).fetchone()
-    if row:
-        _db().execute(
-            "UPDATE embedding_cache SET last_accessed=? WHERE text_hash=?",
-            (int(time.time()), text_hash),
+    return get_cached_embeddings([text], model_name).get(text)
+
+
+def get_cached_embeddings(texts: list[str], model_name: str = "all-MiniLM-L6-v2") -> dict[str, Any]:
+    """Batch lookup: one SELECT per chunk, one transaction for the access-time updates."""
+    by_hash = {_text_hash(t): t for t in texts}
+    hashes = list(by_hash)
+    found: dict[str, Any] = {}
+    for start in range(0, len(hashes), _SQL_CHUNK):
+        chunk = hashes[start:start + _SQL_CHUNK]
+        rows = _read(
+            f"SELECT text_hash, embedding FROM embedding_cache "
+            f"WHERE model_name=? AND text_hash IN ({','.join('?' * len(chunk))})",
+            (model_name, *chunk),
+            keys=chunk,
         )
-        _db().commit()
-        return pickle.loads(row[0])
-    return None
+        for text_hash, blob in rows:
+            found[by_hash[text_hash]] = _decode_embedding(blob)
+
+    if found:
+        now = int(time.time())
+        with _access_lock:
+            for text in found:
+                _pending_access[_text_hash(text)] = now
+        if time.time() - _last_access_flush >= config.EMBEDDING_ACCESS_FLUSH_SECS:
+            flush_access_times()
+    return found
 
 
 def store_embedding(text: str, embedding: Any, model_name: str = "all-MiniLM-L6-v2") -> None:
-    text_hash = hashlib.sha256(text.encode()).hexdigest()
+    store_embeddings([(text, embedding)], model_name)
+
+
+def store_embeddings(items: list[tuple[str, Any]], model_name: str = "all-MiniLM-L6-v2") -> None:
+    """Store many (text, embedding) pairs in one transaction, then evict if over budget."""
+    global _emb_usage
     now = int(time.time())
-    _db().execute(
-        "INSERT OR REPLACE INTO embedding_cache VALUES (?,?,?,?,?,?)",
-        (text_hash, pickle.dumps(embedding), model_name, len(embedding), now, now),
+    rows = [
+        (_text_hash(text), _encode_embedding(embedding), model_name, len(embedding), now, now)
+        for text, embedding in items
+    ]
+    _enqueue("INSERT OR REPLACE INTO embedding_cache VALUES (?,?,?,?,?,?)", rows, many=True, keys=[r[0] for r in rows])
+
+    if _emb_usage is not None:
+        # Replaced rows make this an overestimate; eviction re-measures
+        _emb_usage = (_emb_usage[0] + len(rows), _emb_usage[1] + sum(len(r[1]) for r in rows))
+    evict_embeddings()
+
+
+def flush_access_times() -> None:
+    """Queue buffered last_accessed updates as one batched write."""
+    global _pending_access, _last_access_flush
+    with _access_lock:
+        _last_access_flush = time.time()
+        if not _pending_access:
+            return
+        pending, _pending_access = _pending_access, {}
+    _enqueue(
+        "UPDATE embedding_cache SET last_accessed=? WHERE text_hash=?",
+        [(ts, text_hash) for text_hash, ts in pending.items()],
+        many=True,
+        keys=(),  # only eviction reads last_accessed, and it commits the queue first
     )
-    _db().commit()
+
+
+def _measure_embedding_usage() -> tuple[int, int]:
+    row = _read_one("SELECT COUNT(*), COALESCE(SUM(LENGTH(embedding)), 0) FROM embedding_cache")
+    return row[0], row[1]
+
+
+def evict_embeddings() -> int:
+    """
+    Evict least-recently-used embeddings in batches until the table is within
+    EMBEDDING_CACHE_MAX_ROWS and EMBEDDING_CACHE_MAX_BYTES. Returns rows evicted.
+    """
+    global _emb_usage
+    if _emb_usage is None:
+        _emb_usage = _measure_embedding_usage()
+
+    def _over(usage: tuple[int, int]) -> bool:
+        return usage[0] > config.EMBEDDING_CACHE_MAX_ROWS or usage[1] > config.EMBEDDING_CACHE_MAX_BYTES
+
+    if not _over(_emb_usage):
+        return 0
+
+    # LRU order must reflect buffered accesses
+    flush_access_times()
+    _emb_usage = _measure_embedding_usage()
+    evicted = 0
+    while _over(_emb_usage):
+        with _write() as conn:
+            cur = conn.execute(
+                "DELETE FROM embedding_cache WHERE text_hash IN "
+                "(SELECT text_hash FROM embedding_cache ORDER BY last_accessed LIMIT ?)",
+                (config.EMBEDDING_EVICT_BATCH,),
+            )
+        if cur.rowcount <= 0:
+            break
+        evicted += cur.rowcount
+        _emb_usage = _measure_embedding_usage()
+    return evicted
 
 
 # ── Prerequisite tree cache ────────────────────────────────────────────
 
-def get_cached_tree(topic: str) -> Optional[dict]:
-    row = _db().execute(
-        "SELECT tree_json FROM prerequisite_cache WHERE topic=? AND expires_at>?",
-        (topic, int(time.time())),
-    ).fetchone()
-    return json.loads(row[0]) if row else None
+def get_cached_tree(topic: str) -> Optional[FlatTree]:
+    """Cached tree for a topic; rows are keyed by normalized topic (older rows by the raw one)."""
+    row = _read_one(
+        "SELECT tree_json FROM prerequisite_cache WHERE topic IN (?,?) AND expires_at>?",
+        (normalize_topic(topic), topic, int(time.time())),
+        keys=(normalize_topic(topic), topic),
+    )
+    return FlatTree.from_json(json.loads(row[0])) if row else None
 
 
-def store_tree(topic: str, tree: dict, ttl_days: int = 7) -> None:
-    def _count(node: dict) -> int:
-        return 1 + sum(_count(c) for c in node.get("children", []))
+def cached_tree_topics() -> list[str]:
+    """Keys of every unexpired cached tree."""
+    return [r[0] for r in _read("SELECT topic FROM prerequisite_cache WHERE expires_at>?", (int(time.time()),))]
 
-    def _depth(node: dict, d: int = 0) -> int:
-        children = node.get("children", [])
-        return d if not children else max(_depth(c, d + 1) for c in children)
 
+def store_tree(topic: str, tree: FlatTree, ttl_days: int = 7) -> None:
+    """Store a tree in its compact form (strings interned, index arrays)."""
     now = int(time.time())
-    _db().execute(
+    _enqueue(
         "INSERT OR REPLACE INTO prerequisite_cache VALUES (?,?,?,?,?,?)",
-        (topic, json.dumps(tree), _depth(tree), _count(tree), now, now + ttl_days * 86400),
+        (normalize_topic(topic), json.dumps(tree.to_compact()), tree.max_depth(), len(tree), now, now + ttl_days * 86400),
+        keys=(normalize_topic(topic),),
+    )
+
+
+# ── Prerequisite node cache ────────────────────────────────────────────
+
+def normalize_topic(topic: str) -> str:
+    """Canonical cache key for a topic: lowercase, single-spaced."""
+    return " ".join(topic.lower().split())
+
+
+def get_cached_node(topic: str) -> Optional[dict]:
+    """
+    Look up one decomposed node, shared across all trees.
+    Returns {"prerequisites": list[str] | None, "explanation": str | None};
+    an empty prerequisite list means the topic is a FACT.
+    """
+    row = _read_one(
+        "SELECT prerequisites, explanation FROM prerequisite_node_cache WHERE topic_key=? AND expires_at>?",
+        (normalize_topic(topic), int(time.time())),
+        keys=(normalize_topic(topic),),
+    )
+    if not row:
+        return None
+    return {
+        "prerequisites": json.loads(row[0]) if row[0] is not None else None,
+        "explanation": row[1],
+    }
+
+
+def store_node(
+    topic: str,
+    prerequisites: Optional[list[str]] = None,
+    explanation: Optional[str] = None,
+    ttl_days: int = 7,
+) -> None:
+    """Upsert a node's prerequisite list and/or FACT explanation, keeping the other field."""
+    now = int(time.time())
+    _enqueue(
+        """
+        INSERT INTO prerequisite_node_cache VALUES (?,?,?,?,?)
+        ON CONFLICT(topic_key) DO UPDATE SET
+            prerequisites = COALESCE(excluded.prerequisites, prerequisites),
+            explanation   = COALESCE(excluded.explanation, explanation),
+            expires_at    = excluded.expires_at
+        """,
+        (
+            normalize_topic(topic),
+            json.dumps(prerequisites) if prerequisites is not None else None,
+            explanation,
+            now,
+            now + ttl_days * 86400,
+        ),
+        keys=(normalize_topic(topic),),
     )
-    _db().commit()
+
+
+# ── Explanation cache ──────────────────────────────────────────────────
+
+def _explanation_key(concept: str, known: list[str]) -> str:
+    """Hash of the normalized concept plus the canonical (sorted, de-duplicated) known set."""
+    canonical = sorted({normalize_topic(k) for k in known if k.strip()})
+    payload = json.dumps([normalize_topic(concept), canonical])
+    return hashlib.sha256(payload.encode()).hexdigest()
+
+
+def get_cached_explanation(concept: str, known: list[str]) -> Optional[str]:
+    key = _explanation_key(concept, known)
+    row = _read_one(
+        "SELECT explanation FROM explanation_cache WHERE cache_key=? AND expires_at>?",
+        (key, int(time.time())),
+        keys=(key,),
+    )
+    if row:
+        _enqueue("UPDATE explanation_cache SET hits=hits+1 WHERE cache_key=?", (key,), keys=())
+        return row[0]
+    return None
+
+
+def store_explanation(concept: str, known: list[str], explanation: str, ttl_days: int = 30) -> None:
+    now = int(time.time())
+    key = _explanation_key(concept, known)
+    _enqueue(
+        "INSERT OR REPLACE INTO explanation_cache VALUES (?,?,?,?,?,?)",
+        (key, concept, explanation, 0, now, now + ttl_days * 86400),
+        keys=(key,),
+    )
+
+
+# ── LLM response cache ─────────────────────────────────────────────────
+# L2 for modules/llm_cache.py: completions keyed by a hash of the request.
+
+def get_llm_response(key: str) -> Optional[tuple[str, int]]:
+    """(response, expires_at) for an unexpired completion, or None."""
+    row = _read_one(
+        "SELECT response, expires_at FROM llm_response_cache WHERE cache_key=? AND expires_at>?",
+        (key, int(time.time())),
+        keys=(key,),
+    )
+    return (row[0], row[1]) if row else None
+
+
+def store_llm_response(key: str, family: str, response: str, expires_at: int) -> None:
+    _enqueue(
+        "INSERT OR REPLACE INTO llm_response_cache VALUES (?,?,?,?,?)",
+        (key, family, response, int(time.time()), expires_at),
+        keys=(key,),
+    )
+
+
+# ── Single-flight leases ───────────────────────────────────────────────
+# Cross-process locks for modules/single_flight.py. Written synchronously
+# (not queued) so other workers see them at once; a release also commits
+# any queued cache write of the holder's result before dropping the lease.
+
+def acquire_lease(key: str, owner: str, ttl_secs: float) -> bool:
+    """Take the lease on `key` unless another owner holds an unexpired one."""
+    now = time.time()
+    with _write() as conn:
+        conn.execute("DELETE FROM flight_leases WHERE key=? AND expires_at<=?", (key, now))
+        conn.execute("INSERT OR IGNORE INTO flight_leases VALUES (?,?,?)", (key, owner, now + ttl_secs))
+        row = conn.execute("SELECT owner FROM flight_leases WHERE key=?", (key,)).fetchone()
+    return row is not None and row[0] == owner
+
+
+def lease_active(key: str) -> bool:
+    return _read_one(
+        "SELECT 1 FROM flight_leases WHERE key=? AND expires_at>?", (key, time.time()),
+    ) is not None
+
+
+def release_lease(key: str, owner: str) -> None:
+    with _write() as conn:
+        conn.execute("DELETE FROM flight_leases WHERE key=? AND owner=?", (key, owner))
 
 
 # ── Synthesis question cache ───────────────────────────────────────────
 
 def get_cached_synthesis(concept: str, prerequisites: list[str]) -> Optional[str]:
     key = json.dumps(sorted(prerequisites))
-    row = _db().execute(
+    row = _read_one(
         "SELECT question_text FROM synthesis_cache WHERE concept=? AND prerequisites=?",
         (concept, key),
-    ).fetchone()
+        keys=((concept, key),),
+    )
     return row[0] if row else None
 
 
 def store_synthesis(concept: str, prerequisites: list[str], question: str, difficulty: str = "medium") -> None:
     key = json.dumps(sorted(prerequisites))
-    _db().execute(
+    _enqueue(
         "INSERT OR REPLACE INTO synthesis_cache VALUES (?,?,?,?,?,?,?,?)",
         (concept, key, question, difficulty, 0, 0.0, 0, int(time.time())),
+        keys=((concept, key),),
     )
-    _db().commit()
+
+
+# ── Validation verdicts ───────────────────────────────────────────────
+# LLM answer verdicts, the labelled data for tuning the validator's pre-scorer.
+# weight is 1 / the probability the answer was recorded: answers the
+# pre-scorer failed are only LLM-judged for a sample (VALIDATION_SHADOW_SAMPLE).
+# Only the newest VALIDATION_VERDICTS_MAX_ROWS are kept.
+
+def record_validation(
+    question: str, answer: str, prerequisites: list[str], result: dict, weight: float = 1.0,
+) -> None:
+    _enqueue(
+        "INSERT INTO validation_verdicts "
+        "(question, answer, prerequisites, passed, score, missing, created_at, weight) VALUES (?,?,?,?,?,?,?,?)",
+        (
+            question,
+            answer,
+            json.dumps(prerequisites),
+            int(result["passed"]),
+            result["score"],
+            json.dumps(result["missing"]),
+            int(time.time()),
+            weight,
+        ),
+    )
+    # ids only grow (AUTOINCREMENT), so the newest N are the top N ids: a range delete
+    _enqueue(
+        "DELETE FROM validation_verdicts WHERE id <= (SELECT max(id) FROM validation_verdicts) - ?",
+        (config.VALIDATION_VERDICTS_MAX_ROWS,),
+    )
+
+
+def get_validation_verdicts(limit: int = 10_000) -> list[dict]:
+    """The most recent recorded verdicts, newest first."""
+    rows = _read(
+        "SELECT question, answer, prerequisites, passed, score, missing, weight FROM validation_verdicts "
+        "ORDER BY id DESC LIMIT ?",
+        (limit,),
+    )
+    return [
+        {
+            "question": q,
+            "answer": a,
+            "prerequisites": json.loads(p),
+            "passed": bool(passed),
+            "score": score,
+            "missing": json.loads(m),
+            "weight": weight,
+        }
+        for q, a, p, passed, score, m, weight in rows
+    ]
 
 
 # ── Concept mastery ───────────────────────────────────────────────────
+# Normalized keys of mastered concepts, per user, loaded from the
+# concept_key index and kept current by track_mastery (write-through).
+# Any worker may write the table, so a user's set is reloaded when the
+# user's max(rowid) moves (every INSERT OR REPLACE takes a new rowid).
+
+_mastered: dict[str, tuple[Optional[int], set[str]]] = {}  # user_id → (rev, keys)
+_mastered_db: str | None = None  # cache DB the sets were loaded from
+
 
 def track_mastery(
     concept: str,
@@ -163,24 +816,145 @@ def track_mastery(
     time_spent: int = 0,
     user_id: str = "default",
 ) -> None:
-    _db().execute(
-        "INSERT OR REPLACE INTO concept_mastery VALUES (?,?,?,?,?,?)",
-        (user_id, concept, int(time.time()), synthesis_answer, insights, time_spent),
+    key = normalize_topic(concept)
+    # Mastery is user progress, not a cache: its batch is committed with synchronous=FULL
+    _enqueue(
+        """
+        INSERT OR REPLACE INTO concept_mastery
+            (user_id, concept, mastered_at, synthesis_answer, insights, time_to_master, concept_key)
+        VALUES (?,?,?,?,?,?,?)
+        """,
+        (user_id, concept, int(time.time()), synthesis_answer, insights, time_spent, key),
+        durable=True,
+        keys=(user_id,),
     )
-    _db().commit()
+    entry = _mastered.get(user_id)
+    if entry is not None:
+        entry[1].add(key)
+
+
+_MASTERY_REV_SQL = "SELECT max(rowid) FROM concept_mastery WHERE user_id=?"
+
+
+def mastered_keys(user_id: str = "default") -> set[str]:
+    """Normalized (see normalize_topic) concepts the user has mastered. Do not mutate."""
+    global _mastered_db
+    if _mastered_db != config.CACHE_DB:
+        _mastered.clear()
+        _mastered_db = config.CACHE_DB
+    # Not _read_one: this worker's queued rows are already in the set, no flush needed
+    with _reader() as conn:
+        rev = conn.execute(_MASTERY_REV_SQL, (user_id,)).fetchone()[0]
+    entry = _mastered.get(user_id)
+    if entry is None or entry[0] != rev:
+        # Our queued rows land before the reload
+        rev = _read_one(_MASTERY_REV_SQL, (user_id,), keys=(user_id,))[0]
+        rows = _read("SELECT concept_key FROM concept_mastery WHERE user_id=?", (user_id,), keys=(user_id,))
+        entry = _mastered[user_id] = (rev, {r[0] for r in rows})
+    return entry[1]
 
 
 def get_mastered_concepts(user_id: str = "default") -> list[dict]:
-    rows = _db().execute(
+    rows = _read(
         "SELECT concept, mastered_at, insights FROM concept_mastery WHERE user_id=?",
         (user_id,),
-    ).fetchall()
+        keys=(user_id,),
+    )
     return [{"concept": r[0], "mastered_at": r[1], "insights": r[2]} for r in rows]
 
 
 def is_mastered(concept: str, user_id: str = "default") -> bool:
-    row = _db().execute(
-        "SELECT 1 FROM concept_mastery WHERE user_id=? AND concept=?",
-        (user_id, concept),
-    ).fetchone()
-    return row is not None
+    return normalize_topic(concept) in mastered_keys(user_id)
+
+
+# ── Memory store ──────────────────────────────────────────────────────
+# The knowledge graph behind memory.md. Every write bumps a revision
+# counter so readers (the markdown export, search indexes) can tell
+# cheaply whether anything changed.
+
+def memory_revision() -> int:
+    return int(get_memory_meta("revision") or 0)
+
+
+def get_memory_meta(key: str) -> Optional[str]:
+    row = _read_one("SELECT value FROM memory_meta WHERE key=?", (key,), keys=(key,))
+    return row[0] if row else None
+
+
+def set_memory_meta(key: str, value: str) -> None:
+    _enqueue("INSERT OR REPLACE INTO memory_meta VALUES (?,?)", (key, value), keys=(key,))
+
+
+def _bump_memory_revision(conn: sqlite3.Connection) -> None:
+    conn.execute(
+        """
+        INSERT INTO memory_meta VALUES ('revision', '1')
+        ON CONFLICT(key) DO UPDATE SET value = CAST(value AS INTEGER) + 1
+        """
+    )
+
+
+def get_memory_profile() -> list[tuple[str, str]]:
+    return _read("SELECT field, value FROM memory_profile ORDER BY position")
+
+
+def store_memory_profile(fields: dict[str, str], overwrite: bool = True) -> None:
+    """Set profile fields; with overwrite=False existing values are kept (used for seeding)."""
+    with _write() as conn:
+        verb = "INSERT OR REPLACE" if overwrite else "INSERT OR IGNORE"
+        start = conn.execute("SELECT COALESCE(MAX(position), -1) + 1 FROM memory_profile").fetchone()[0]
+        existing = dict(conn.execute("SELECT field, position FROM memory_profile").fetchall())
+        rows = [
+            (field, value, existing.get(field, start + i))
+            for i, (field, value) in enumerate(fields.items())
+        ]
+        cur = conn.executemany(f"{verb} INTO memory_profile VALUES (?,?,?)", rows)
+        if cur.rowcount:
+            _bump_memory_revision(conn)
+
+
+def get_memory_topics() -> list[tuple[str, int]]:
+    """Mastered topics as (concept, mastered_at), in order of mastery."""
+    return _read("SELECT concept, mastered_at FROM memory_topics ORDER BY mastered_at, rowid")
+
+
+def get_memory_insights() -> list[tuple[int, str, str, str, int]]:
+    """Synthesis insights as (id, concept, answer, insight, created_at), oldest first."""
+    return _read("SELECT id, concept, answer, insight, created_at FROM memory_insights ORDER BY id")
+
+
+def store_memory_mastery(concept: str, answer: str, insight: str, mastered_at: Optional[int] = None) -> None:
+    """Mark a topic mastered and record the synthesis answer/insight that proved it."""
+    mastered_at = mastered_at or int(time.time())
+    with _write() as conn:
+        conn.execute(
+            "INSERT OR REPLACE INTO memory_topics VALUES (?,?,?)",
+            (normalize_topic(concept), concept, mastered_at),
+        )
+        conn.execute(
+            "INSERT INTO memory_insights (concept, answer, insight, created_at) VALUES (?,?,?,?)",
+            (concept, answer, insight, mastered_at),
+        )
+        _bump_memory_revision(conn)
+
+
+def get_memory_tree() -> list[tuple[int, str]]:
+    """Progress tree as pre-order (depth, topic) rows."""
+    return _read("SELECT depth, topic FROM memory_tree_nodes ORDER BY position")
+
+
+def store_memory_tree(nodes: list[tuple[int, str]]) -> int:
+    """Replace the progress tree, writing only the rows that differ. Returns rows changed."""
+    with _write() as conn:
+        current = conn.execute("SELECT position, depth, topic FROM memory_tree_nodes").fetchall()
+        current_by_pos = {pos: (depth, topic) for pos, depth, topic in current}
+        changed = [
+            (pos, depth, topic)
+            for pos, (depth, topic) in enumerate(nodes)
+            if current_by_pos.get(pos) != (depth, topic)
+        ]
+        conn.executemany("INSERT OR REPLACE INTO memory_tree_nodes VALUES (?,?,?)", changed)
+        removed = conn.execute("DELETE FROM memory_tree_nodes WHERE position>=?", (len(nodes),)).rowcount
+        if changed or removed:
+            _bump_memory_revision(conn)
+        return len(changed) + removed
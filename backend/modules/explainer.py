@@ -3,7 +3,11 @@ First-Principles Explainer — generates concept explanations
 building from what the user already knows.
 """
 
-from modules.llm_client import call_llm
+import asyncio
+
+from config import config
+from modules.llm_client import acall_llm, emit_token
+from modules import cache
 
 
 EXPLAIN_PROMPT = """You are a world-class teacher who explains concepts using first principles.
@@ -22,11 +26,21 @@ Rules:
 Explain "{concept}":"""
 
 
-def explain_concept(concept: str, known_concepts: list[str] | None = None) -> str:
-    """Generate a first-principles explanation of a concept."""
+async def explain_concept(concept: str, known_concepts: list[str] | None = None) -> str:
+    """Generate a first-principles explanation of a concept (cached per concept + known set)."""
+    cached = await asyncio.to_thread(cache.get_cached_explanation, concept, known_concepts or [])
+    if cached:
+        emit_token(cached)
+        return cached
+
     known = ", ".join(known_concepts) if known_concepts else "basic everyday experience"
-    response = call_llm(
+    response = await acall_llm(
         EXPLAIN_PROMPT.format(concept=concept, known=known),
         temperature=0.7,
+        stream=True,
     )
+    if not response.startswith("Error:"):
+        cache.store_explanation(
+            concept, known_concepts or [], response, ttl_days=config.EXPLANATION_CACHE_TTL_DAYS,
+        )
     return response
@@ -0,0 +1,209 @@
+"""
+Flat Tree — compact, array-backed prerequisite tree. Nodes live in
+pre-order in parallel int arrays (parent / first child / next sibling),
+node types in a byte array, and every topic or explanation string is
+interned once per tree. Traversals are iterative; nested dicts are built
+only at the JSON boundary (to_dict).
+"""
+
+from array import array
+from typing import Iterator, Optional
+
+NODE_TYPES = ("CONCEPT", "FACT", "LEAF", "MASTERED", "ROOT")
+_TYPE_CODES = {name: code for code, name in enumerate(NODE_TYPES)}
+_NONE = -1
+
+
+class FlatTree:
+    """A prerequisite tree; node 0 is the root. Append nodes in pre-order with add()."""
+
+    __slots__ = (
+        "strings", "_string_ids", "topic", "explanation",
+        "parent", "first_child", "next_sibling", "_last_child",
+        "node_type", "reasons",
+    )
+
+    def __init__(self):
+        self.strings: list[str] = []
+        self._string_ids: dict[str, int] = {}
+        self.topic = array("i")
+        self.explanation = array("i")       # string id, or -1
+        self.parent = array("i")            # -1 for the root
+        self.first_child = array("i")
+        self.next_sibling = array("i")
+        self._last_child = array("i")       # only needed while appending
+        self.node_type = bytearray()        # index into NODE_TYPES
+        self.reasons: dict[int, str] = {}   # sparse, e.g. "cycle" leaves
+
+    def __len__(self) -> int:
+        return len(self.topic)
+
+    def __eq__(self, other: object) -> bool:
+        if not isinstance(other, FlatTree):
+            return NotImplemented
+        return self.to_compact() == other.to_compact()
+
+    # ── Building ──────────────────────────────────────────────────────
+
+    def _intern(self, text: str) -> int:
+        sid = self._string_ids.get(text)
+        if sid is None:
+            sid = self._string_ids[text] = len(self.strings)
+            self.strings.append(text)
+        return sid
+
+    def add(
+        self,
+        parent: int,
+        topic: str,
+        node_type: str = "CONCEPT",
+        explanation: Optional[str] = None,
+        reason: Optional[str] = None,
+    ) -> int:
+        """Append a node as the last child of `parent` (-1 for the root); returns its index."""
+        node = len(self.topic)
+        self.topic.append(self._intern(topic))
+        self.explanation.append(self._intern(explanation) if explanation is not None else _NONE)
+        self.parent.append(parent)
+        self.first_child.append(_NONE)
+        self.next_sibling.append(_NONE)
+        self._last_child.append(_NONE)
+        self.node_type.append(_TYPE_CODES[node_type])
+        if reason is not None:
+            self.reasons[node] = reason
+        if parent != _NONE:
+            last = self._last_child[parent]
+            if last == _NONE:
+                self.first_child[parent] = node
+            else:
+                self.next_sibling[last] = node
+            self._last_child[parent] = node
+        return node
+
+    def with_types(self, node_type: bytearray) -> "FlatTree":
+        """A tree sharing this one's (read-only) structure and strings, with other node types."""
+        view = FlatTree.__new__(FlatTree)
+        for slot in FlatTree.__slots__:
+            setattr(view, slot, getattr(self, slot))
+        view.node_type = node_type
+        return view
+
+    # ── Traversal ─────────────────────────────────────────────────────
+
+    def children(self, node: int) -> Iterator[int]:
+        child = self.first_child[node]
+        while child != _NONE:
+            yield child
+            child = self.next_sibling[child]
+
+    def depths(self) -> array:
+        """Depth of every node (pre-order means a parent's depth is always known first)."""
+        depths = array("i", bytes(4 * len(self)))
+        parent = self.parent
+        for node in range(1, len(self)):
+            depths[node] = depths[parent[node]] + 1
+        return depths
+
+    def max_depth(self) -> int:
+        return max(self.depths(), default=0)
+
+    def type_of(self, node: int) -> str:
+        return NODE_TYPES[self.node_type[node]]
+
+    def teaching_order(self) -> list[dict]:
+        """Post-order, de-duplicated by topic: the bottom-up teaching sequence."""
+        order: list[dict] = []
+        seen: set[str] = set()
+        keys = [s.lower().strip() for s in self.strings]
+        stack: list[tuple[int, bool]] = [(0, False)] if len(self) else []
+        while stack:
+            node, expanded = stack.pop()
+            if not expanded:
+                stack.append((node, True))
+                stack.extend((child, False) for child in reversed(list(self.children(node))))
+                continue
+            key = keys[self.topic[node]]
+            if key not in seen:
+                seen.add(key)
+                exp = self.explanation[node]
+                order.append({
+                    "topic": self.strings[self.topic[node]],
+                    "type": self.type_of(node),
+                    "explanation": self.strings[exp] if exp != _NONE else "",
+                })
+        return order
+
+    def to_text(self, indent: int = 0) -> str:
+        """Indented outline; pre-order storage means this is a single pass."""
+        lines = []
+        for node, depth in enumerate(self.depths()):
+            marker = " [FACT]" if self.node_type[node] == _TYPE_CODES["FACT"] else ""
+            lines.append(f"{'  ' * (indent + depth)}├─ {self.strings[self.topic[node]]}{marker}")
+        return "\n".join(lines)
+
+    # ── Conversion ────────────────────────────────────────────────────
+
+    def to_dict(self) -> dict:
+        """Nested {topic, type, explanation?, reason?, children[]} dicts for JSON responses."""
+        nodes: list[dict] = []
+        for node in range(len(self)):
+            d: dict = {"topic": self.strings[self.topic[node]], "type": self.type_of(node)}
+            if self.explanation[node] != _NONE:
+                d["explanation"] = self.strings[self.explanation[node]]
+            d["children"] = []
+            if node in self.reasons:
+                d["reason"] = self.reasons[node]
+            nodes.append(d)
+            if node:
+                nodes[self.parent[node]]["children"].append(d)
+        return nodes[0] if nodes else {}
+
+    @classmethod
+    def from_dict(cls, tree: dict) -> "FlatTree":
+        flat = cls()
+        stack: list[tuple[dict, int]] = [(tree, _NONE)]
+        while stack:
+            node, parent = stack.pop()
+            index = flat.add(
+                parent,
+                node["topic"],
+                node.get("type", "CONCEPT"),
+                node.get("explanation"),
+                node.get("reason"),
+            )
+            stack.extend((child, index) for child in reversed(node.get("children", [])))
+        return flat
+
+    def to_compact(self) -> dict:
+        """JSON-ready arrays; far smaller than the nested form since strings appear once."""
+        return {
+            "strings": self.strings,
+            "topic": self.topic.tolist(),
+            "explanation": self.explanation.tolist(),
+            "parent": self.parent.tolist(),
+            "type": self.node_type.hex(),
+            "reasons": {str(node): reason for node, reason in self.reasons.items()},
+        }
+
+    @classmethod
+    def from_compact(cls, data: dict) -> "FlatTree":
+        flat = cls()
+        for text in data["strings"]:
+            flat._intern(text)
+        node_types = bytes.fromhex(data["type"])
+        reasons = {int(node): reason for node, reason in data["reasons"].items()}
+        strings = data["strings"]
+        for node, (topic, explanation, parent) in enumerate(zip(data["topic"], data["explanation"], data["parent"])):
+            flat.add(
+                parent,
+                strings[topic],
+                NODE_TYPES[node_types[node]],
+                strings[explanation] if explanation != _NONE else None,
+                reasons.get(node),
+            )
+        return flat
+
+    @classmethod
+    def from_json(cls, data: dict) -> "FlatTree":
+        """Load either the compact form or a nested dict (older cache rows, clients)."""
+        return cls.from_compact(data) if "strings" in data else cls.from_dict(data)
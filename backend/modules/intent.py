@@ -0,0 +1,166 @@
+"""
+Intent Router — classifies a chat message that no teaching state claims as
+learn / continue / chitchat / reset without an LLM call. Learning
+triggers and short stock phrases are caught by rules; everything else is
+compared with cached prototype embeddings (nearest prototype, cosine
+similarity). Messages that match nothing well enough are left to the LLM
+fallback.
+"""
+
+import re
+import time
+from collections import Counter, deque
+from typing import Optional
+
+import numpy as np
+
+from config import config
+from modules import search
+
+
+INTENTS = ("learn", "continue", "chitchat", "reset")
+
+LEARN_TRIGGERS = (
+    "what is", "explain", "teach me", "learn:", "learn about",
+    "how does", "i want to learn", "help me understand",
+    "tell me about", "break down",
+)
+CONTINUE_WORDS = {
+    "yes", "ready", "next", "continue", "ok", "okay", "sure", "yeah", "yep",
+    "got it", "makes sense", "go on", "go ahead", "let's go",
+}
+CHITCHAT_WORDS = {
+    "hi", "hello", "hey", "thanks", "thank you", "thx", "cheers", "bye", "goodbye",
+    "good morning", "good evening", "how are you", "nice", "cool", "great", "awesome",
+}
+RESET_WORDS = {"reset", "restart", "start over", "start again", "new topic"}
+
+PROTOTYPES = {
+    "learn": [
+        "I want to learn about photosynthesis",
+        "can you teach me linear algebra",
+        "what is a neural network",
+        "how does a transistor work",
+        "I'd like to understand quantum mechanics",
+        "explain supply and demand to me",
+        "I'm curious about how vaccines work",
+    ],
+    "continue": [
+        "ok next please",
+        "yes I'm ready, let's continue",
+        "that makes sense, go on",
+        "got it, what's next",
+        "sure, move on",
+        "alright keep going",
+    ],
+    "chitchat": [
+        "hello there",
+        "hi, how are you",
+        "thanks a lot",
+        "thank you, that was helpful",
+        "good morning",
+        "bye, see you later",
+        "you're awesome",
+        "lol nice",
+    ],
+    "reset": [
+        "start over",
+        "reset everything",
+        "let's begin again from scratch",
+        "clear my progress and restart",
+        "I want a new topic instead",
+    ],
+}
+
+_prototype_vectors: Optional[np.ndarray] = None   # normalized, one row per phrase
+_prototype_intents: list[str] = []
+_embeddings_available = True
+
+_counts: Counter = Counter()                     # "<intent>:<source>"
+_latencies_ms: deque = deque(maxlen=1000)
+
+
+def classify(message: str) -> dict:
+    """
+    {"intent": one of INTENTS or None, "score": float, "source": "rule" | "embedding" | "none",
+     "ms": decision time}. None means the LLM fallback should answer.
+    """
+    start = time.perf_counter()
+    intent, score, source = _classify(message)
+    ms = (time.perf_counter() - start) * 1000
+    _counts[f"{intent}:{source}"] += 1
+    _latencies_ms.append(ms)
+    return {"intent": intent, "score": score, "source": source, "ms": ms}
+
+
+def canned_response(intent: Optional[str], concept: Optional[str] = None) -> Optional[str]:
+    """
+    A templated reply for intents handled without the LLM; `concept` is the
+    one in progress, if any. "learn" here is an embedding match: the topic
+    is not reliably extractable, so the user is asked to name it.
+    """
+    if intent == "learn":
+        return "Sounds like you want to learn something! Type **Learn: [topic name]** and I'll break it down for you."
+    if intent == "chitchat":
+        if concept:
+            return f"Happy to help! Say **next** whenever you're ready to continue with **{concept}**."
+        return "Hi! Type **Learn: [topic name]** and I'll break it down into building blocks for you."
+    if intent == "continue" and not concept:
+        return "There's nothing in progress yet. Type **Learn: [topic name]** to start a new topic."
+    if intent == "reset":
+        return (
+            "To start over, open a **New Chat** from the sidebar, or just type "
+            "**Learn: [topic name]** to switch to a different topic."
+        )
+    return None
+
+
+def stats() -> dict:
+    """Decisions per intent and source, plus decision latency percentiles."""
+    latencies = sorted(_latencies_ms)
+    return {
+        "decisions": dict(_counts),
+        "p50_ms": round(latencies[len(latencies) // 2], 3) if latencies else None,
+        "p95_ms": round(latencies[int(len(latencies) * 0.95)], 3) if latencies else None,
+    }
+
+
+def _classify(message: str) -> tuple[Optional[str], float, str]:
+    global _embeddings_available
+    lower = message.lower().strip()
+    words = " ".join(re.findall(r"[a-z']+", lower))
+    if any(t in lower for t in LEARN_TRIGGERS):
+        return "learn", 1.0, "rule"
+    # Short messages made of stock phrases
+    if len(words.split()) <= 4:
+        for name, phrases in (("continue", CONTINUE_WORDS), ("reset", RESET_WORDS), ("chitchat", CHITCHAT_WORDS)):
+            if any(re.search(rf"\b{re.escape(p)}\b", words) for p in phrases):
+                return name, 1.0, "rule"
+
+    if _embeddings_available and config.INTENT_EMBEDDINGS:
+        try:
+            vectors, intents = _prototypes()
+            query = search._normalized(search._embed_batch([lower]))[0]
+        except ImportError as e:
+            print(f"[INTENT] Embedding router disabled: {e}")
+            _embeddings_available = False
+        except Exception as e:
+            # Model load / encode failure: leave this message to the LLM
+            print(f"[INTENT] Embedding router failed: {e}")
+        else:
+            similarities = vectors @ query
+            best = int(np.argmax(similarities))
+            if similarities[best] >= config.INTENT_MIN_SIM:
+                return intents[best], float(similarities[best]), "embedding"
+            return None, float(similarities[best]), "none"
+    return None, 0.0, "none"
+
+
+def _prototypes() -> tuple[np.ndarray, list[str]]:
+    """Prototype phrase embeddings, computed once (and cached in embedding_cache)."""
+    global _prototype_vectors, _prototype_intents
+    if _prototype_vectors is None:
+        phrases = [(intent, p.lower()) for intent in INTENTS for p in PROTOTYPES[intent]]
+        _prototype_vectors = search._normalized(search._embed_batch([p for _, p in phrases]))
+        _prototype_intents = [intent for intent, _ in phrases]
+    return _prototype_vectors, _prototype_intents
@@ -0,0 +1,98 @@
+"""
+LLM Cache — content-addressed completion cache under llm_client. A call is
+keyed by a hash of (model, messages, temperature, max_tokens); the system
+prompt is part of the messages. Callers tag each call with a prompt family
+and config.LLM_CACHE_POLICY decides, per family, whether its completions
+are reused and for how long. Lookups go through an in-memory LRU (L1) and
+then the SQLite llm_response_cache table (L2).
+"""
+
+import hashlib
+import json
+import threading
+import time
+from collections import Counter, OrderedDict
+from typing import Optional
+
+from config import config
+from modules import cache
+
+
+# key → (expires_at, response), least recently used first
+_l1: "OrderedDict[str, tuple[float, str]]" = OrderedDict()
+_lock = threading.Lock()  # sync calls run on worker threads
+_stats: dict[str, Counter] = {}
+
+
+def ttl_for(family: Optional[str]) -> int:
+    """Seconds a family's completions stay cached; 0 means not cacheable."""
+    if not config.LLM_CACHE_ENABLED or family is None:
+        return 0
+    return config.LLM_CACHE_POLICY.get(family, 0)
+
+
+def make_key(messages: list[dict], temperature: float, max_tokens: int) -> str:
+    payload = json.dumps([config.LLM_MODEL, messages, temperature, max_tokens], sort_keys=True)
+    return hashlib.sha256(payload.encode()).hexdigest()
+
+
+def get(family: str, key: str) -> Optional[str]:
+    """Cached completion for `key`, from L1 or else L2 (promoted into L1)."""
+    response, level = _lookup(key)
+    _count(family, f"{level}_hits" if response is not None else "misses")
+    return response
+
+
+def peek(key: str) -> Optional[str]:
+    """Like get(), without counting; used while waiting on an in-flight call."""
+    return _lookup(key)[0]
+
+
+def put(family: str, key: str, response: str) -> None:
+    """Store a successful completion under the family's TTL."""
+    ttl = ttl_for(family)
+    if not ttl or response.startswith("Error:"):
+        return
+    expires_at = int(time.time()) + ttl
+    _remember(key, response, expires_at)
+    cache.store_llm_response(key, family, response, expires_at)
+
+
+def stats() -> dict[str, dict[str, int]]:
+    """Per-family l1_hits / l2_hits / misses since the process started."""
+    with _lock:
+        return {family: dict(counts) for family, counts in _stats.items()}
+
+
+def clear() -> None:
+    """Drop the in-memory layer and counters (L2 rows expire on their own)."""
+    with _lock:
+        _l1.clear()
+        _stats.clear()
+
+
+def _lookup(key: str) -> tuple[Optional[str], str]:
+    now = time.time()
+    with _lock:
+        entry = _l1.get(key)
+        if entry is not None and entry[0] > now:
+            _l1.move_to_end(key)
+            return entry[1], "l1"
+    row = cache.get_llm_response(key)
+    if row is None:
+        return None, "l2"
+    _remember(key, *row)
+    return row[0], "l2"
+
+
+def _remember(key: str, response: str, expires_at: float) -> None:
+    with _lock:
+        _l1[key] = (expires_at, response)
+        _l1.move_to_end(key)
+        while len(_l1) > config.LLM_CACHE_L1_MAX:
+            _l1.popitem(last=False)
+
+
+def _count(family: str, field: str) -> None:
+    with _lock:
+        _stats.setdefault(family, Counter())[field] += 1
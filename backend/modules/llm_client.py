@@ -1,9 +1,22 @@
 """
 LLM Client — OpenAI-compatible wrapper for NVIDIA API (integrate.api.nvidia.com).
+Provides blocking calls plus async variants that share one pooled,
+keep-alive HTTP client so request handlers never block the event loop.
+Async calls made with stream=True forward tokens to the active token sink.
+Calls tagged with a prompt family may be answered from modules/llm_cache,
+and identical ones in flight at the same time are coalesced.
 """
 
-from openai import OpenAI
+import asyncio
+from contextlib import asynccontextmanager
+from contextvars import ContextVar, Token
+from typing import Callable, Optional
+
+import httpx
+from openai import AsyncOpenAI, OpenAI
 from config import config
+from modules import llm_cache
+from modules import single_flight
 
 
 _client = OpenAI(
@@ -11,19 +24,114 @@ _client = OpenAI(
     base_url=config.NVIDIA_BASE_URL,
 )
 
+_async_client: AsyncOpenAI | None = None
+
+
+def _get_async_client() -> AsyncOpenAI:
+    """Lazily create the shared async client (one connection pool per process)."""
+    global _async_client
+    if _async_client is None:
+        _async_client = AsyncOpenAI(
+            api_key=config.NVIDIA_API_KEY,
+            base_url=config.NVIDIA_BASE_URL,
+            http_client=httpx.AsyncClient(
+                limits=httpx.Limits(
+                    max_connections=config.LLM_MAX_CONNECTIONS,
+                    max_keepalive_connections=config.LLM_MAX_KEEPALIVE,
+                    keepalive_expiry=config.LLM_KEEPALIVE_SECS,
+                ),
+                timeout=httpx.Timeout(config.LLM_TIMEOUT_SECS, connect=10.0),
+            ),
+        )
+    return _async_client
+
+
+async def aclose() -> None:
+    """Close the shared async client's connection pool (call on shutdown)."""
+    global _async_client
+    if _async_client is not None:
+        await _async_client.close()
+        _async_client = None
+
+
+# ── Token streaming ────────────────────────────────────────────────────
+
+_token_sink: ContextVar[Optional[Callable[[str], None]]] = ContextVar("token_sink", default=None)
+
+
+def set_token_sink(sink: Optional[Callable[[str], None]]) -> Token:
+    """Route streamed tokens in the current context to `sink` (None disables)."""
+    return _token_sink.set(sink)
+
+
+def reset_token_sink(token: Token) -> None:
+    _token_sink.reset(token)
+
+
+def emit_token(text: str) -> None:
+    """Forward text to the active token sink, if any."""
+    sink = _token_sink.get()
+    if sink is not None and text:
+        sink(text)
+
+
+# ── Per-request concurrency budget ──────────────────────────────────────
+
+_request_budget: ContextVar[Optional[asyncio.Semaphore]] = ContextVar("request_budget", default=None)
+
+
+def set_request_budget(limit: Optional[int]) -> Token:
+    """
+    Cap the remote LLM calls in flight for the current request, including
+    tasks it spawns (they inherit the context). None or 0 removes the cap.
+    """
+    return _request_budget.set(asyncio.Semaphore(limit) if limit else None)
+
+
+@asynccontextmanager
+async def _budget_slot():
+    budget = _request_budget.get()
+    if budget is None:
+        yield
+        return
+    async with budget:
+        yield
+
+
+def _messages(prompt: str, system_prompt: str) -> list[dict]:
+    messages = []
+    if system_prompt:
+        messages.append({"role": "system", "content": system_prompt})
+    messages.append({"role": "user", "content": prompt})
+    return messages
+
 
 def call_llm(
     prompt: str,
     system_prompt: str = "",
     temperature: float = 0.7,
     max_tokens: int = 4096,
+    family: Optional[str] = None,
 ) -> str:
     """Send a chat completion request and return the text response."""
-    messages = []
-    if system_prompt:
-        messages.append({"role": "system", "content": system_prompt})
-    messages.append({"role": "user", "content": prompt})
+    return call_llm_with_history(_messages(prompt, system_prompt), temperature, max_tokens, family=family)
+
 
+def call_llm_with_history(
+    messages: list[dict],
+    temperature: float = 0.7,
+    max_tokens: int = 4096,
+    family: Optional[str] = None,
+) -> str:
+    """
+    Send a multi-turn chat completion request. `family` names the prompt
+    family for the response cache (see config.LLM_CACHE_POLICY).
+    """
+    key = _cache_key(family, messages, temperature, max_tokens)
+    if key is not None:
+        cached = llm_cache.get(family, key)
+        if cached is not None:
+            return cached
     try:
         response = _client.chat.completions.create(
             model=config.LLM_MODEL,
@@ -32,20 +140,71 @@ def call_llm(
             top_p=1,
             max_tokens=max_tokens,
         )
-        return response.choices[0].message.content.strip()
+        text = response.choices[0].message.content.strip()
     except Exception as e:
         print(f"[LLM ERROR] {e}")
         return f"Error: {e}"
+    if key is not None:
+        llm_cache.put(family, key, text)
+    return text
 
 
-def call_llm_with_history(
+async def acall_llm(
+    prompt: str,
+    system_prompt: str = "",
+    temperature: float = 0.7,
+    max_tokens: int = 4096,
+    stream: bool = False,
+    family: Optional[str] = None,
+) -> str:
+    """Async variant of call_llm using the pooled client."""
+    return await acall_llm_with_history(
+        _messages(prompt, system_prompt), temperature, max_tokens, stream=stream, family=family,
+    )
+
+
+async def acall_llm_with_history(
     messages: list[dict],
     temperature: float = 0.7,
     max_tokens: int = 4096,
+    stream: bool = False,
+    family: Optional[str] = None,
 ) -> str:
-    """Send a multi-turn chat completion request."""
+    """
+    Async variant of call_llm_with_history using the pooled client.
+    With stream=True and a token sink set, tokens are forwarded as they arrive
+    (a cached response is forwarded in one piece); the full text is returned
+    either way.
+    """
+    key = _cache_key(family, messages, temperature, max_tokens)
+    if key is not None:
+        cached = await asyncio.to_thread(llm_cache.get, family, key)
+        if cached is not None:
+            if stream:
+                emit_token(cached)
+            return cached
+        if not (stream and _token_sink.get() is not None):
+            # Identical prompts in flight here or in another worker share one completion
+            budget = _request_budget.get()
+            return await single_flight.run(
+                f"llm:{key}",
+                lambda: _acomplete_and_cache(family, key, messages, temperature, max_tokens, budget),
+                lookup=lambda: llm_cache.peek(key),
+                lease_secs=config.LLM_TIMEOUT_SECS,
+            )
+    async with _budget_slot():
+        if stream and _token_sink.get() is not None:
+            text = await _stream_completion(messages, temperature, max_tokens)
+        else:
+            text = await _acomplete(messages, temperature, max_tokens)
+    if key is not None:
+        llm_cache.put(family, key, text)
+    return text
+
+
+async def _acomplete(messages: list[dict], temperature: float, max_tokens: int) -> str:
     try:
-        response = _client.chat.completions.create(
+        response = await _get_async_client().chat.completions.create(
             model=config.LLM_MODEL,
             messages=messages,
             temperature=temperature,
@@ -56,3 +215,48 @@ def call_llm_with_history(
     except Exception as e:
         print(f"[LLM ERROR] {e}")
         return f"Error: {e}"
+
+
+async def _acomplete_and_cache(
+    family: str, key: str, messages: list[dict], temperature: float, max_tokens: int,
+    budget: Optional[asyncio.Semaphore],
+) -> str:
+    # Runs as single_flight's shared task, in a fresh context: charge the leader's budget
+    _request_budget.set(budget)
+    async with _budget_slot():
+        text = await _acomplete(messages, temperature, max_tokens)
+    llm_cache.put(family, key, text)
+    return text
+
+
+def _cache_key(family: Optional[str], messages: list[dict], temperature: float, max_tokens: int) -> Optional[str]:
+    """Response-cache key, or None when the family is not cacheable."""
+    if not llm_cache.ttl_for(family):
+        return None
+    return llm_cache.make_key(messages, temperature, max_tokens)
+
+
+async def _stream_completion(messages: list[dict], temperature: float, max_tokens: int) -> str:
+    parts: list[str] = []
+    try:
+        chunks = await _get_async_client().chat.completions.create(
+            model=config.LLM_MODEL,
+            messages=messages,
+            temperature=temperature,
+            top_p=1,
+            max_tokens=max_tokens,
+            stream=True,
+        )
+        async for chunk in chunks:
+            if not chunk.choices:
+                continue
+            delta = chunk.choices[0].delta.content or ""
+            if not parts:
+                delta = delta.lstrip()
+            if delta:
+                parts.append(delta)
+                emit_token(delta)
+        return "".join(parts).strip()
+    except Exception as e:
+        print(f"[LLM ERROR] {e}")
+        return f"Error: {e}"
@@ -1,6 +1,6 @@
 """
 Memory Manager — Read/write/append the 3 OpenClaw-style markdown memory files.
-  memory.md   → lifetime knowledge graph
+  memory.md   → lifetime knowledge graph (export view of the SQLite memory store)
   daily.md    → today's session log
   conversation.md → active chat transcript
 """
@@ -8,6 +8,11 @@ Memory Manager — Read/write/append the 3 OpenClaw-style markdown memory files.
 import os
 from datetime import datetime
 from config import config
+from modules import cache
+
+_DEFAULT_PROFILE = {"Learning style": "unknown", "Struggles with": "unknown"}
+_exported_revision: int | None = None
+_store_ready_for: str | None = None  # cache DB the store was seeded in
 
 
 def _path(filename: str) -> str:
@@ -15,19 +20,10 @@ def _path(filename: str) -> str:
 
 
 def ensure_files() -> None:
-    """Create memory directory and seed files if they don't exist."""
+    """Create memory directory, seed files if they don't exist, and prepare the memory store."""
     os.makedirs(config.MEMORY_DIR, exist_ok=True)
 
     defaults = {
-        "memory.md": (
-            "# User Knowledge Graph\n\n"
-            "## User Profile\n"
-            "- Learning style: unknown\n"
-            "- Struggles with: unknown\n\n"
-            "## Topics Mastered\n\n"
-            "## Learning Progress Tree\n\n"
-            "## Synthesis Insights\n\n"
-        ),
         "daily.md": (
             f"# Daily Log: {datetime.now().strftime('%Y-%m-%d')}\n\n"
             "## Session Goal\n\n"
@@ -44,10 +40,62 @@ def ensure_files() -> None:
             with open(p, "w", encoding="utf-8") as f:
                 f.write(content)
 
+    _ensure_store()
+
+
+def _ensure_store() -> None:
+    """Seed the memory store, importing a pre-existing memory.md once."""
+    global _store_ready_for
+    if _store_ready_for == config.CACHE_DB:
+        return
+    if cache.get_memory_meta("markdown_imported") is None:
+        if os.path.exists(_path("memory.md")):
+            _import_markdown(_read_file("memory.md"))
+        cache.set_memory_meta("markdown_imported", "1")
+    cache.store_memory_profile(_DEFAULT_PROFILE, overwrite=False)
+    _store_ready_for = config.CACHE_DB
+
+
+def _import_markdown(content: str) -> None:
+    """Load a memory.md written by older versions into the structured tables."""
+    profile: dict[str, str] = {}
+    tree: list[tuple[int, str]] = []
+    mastery: list[dict] = []
+    section = ""
+    for line in content.split("\n"):
+        stripped = line.strip()
+        if line.startswith("## "):
+            section = line[3:].strip()
+        elif line.startswith("### "):
+            mastery.append({"concept": line[4:].strip(), "answer": "", "insight": "", "mastered_at": None})
+        elif mastery and stripped.startswith("- ") and ":" in stripped:
+            field, value = (part.strip() for part in stripped[2:].split(":", 1))
+            if field == "Mastered":
+                try:
+                    mastery[-1]["mastered_at"] = int(datetime.strptime(value, "%Y-%m-%d %H:%M").timestamp())
+                except ValueError:
+                    pass
+            elif field == "Synthesis answer":
+                mastery[-1]["answer"] = value
+            elif field == "Key insight":
+                mastery[-1]["insight"] = value
+        elif section == "User Profile" and stripped.startswith("- ") and ":" in stripped:
+            field, value = (part.strip() for part in stripped[2:].split(":", 1))
+            profile[field] = value
+        elif section == "Learning Progress Tree" and stripped:
+            tree.append(_parse_tree_line(line))
+
+    if profile:
+        cache.store_memory_profile(profile)
+    if tree:
+        cache.store_memory_tree(tree)
+    for m in mastery:
+        cache.store_memory_mastery(m["concept"], m["answer"], m["insight"], m["mastered_at"])
+
 
 # ── Readers ────────────────────────────────────────────────────────────
 
-def read(filename: str) -> str:
+def _read_file(filename: str) -> str:
     p = _path(filename)
     if not os.path.exists(p):
         return ""
@@ -55,6 +103,12 @@ def read(filename: str) -> str:
         return f.read()
 
 
+def read(filename: str) -> str:
+    if filename == "memory.md":
+        return export_memory()
+    return _read_file(filename)
+
+
 def read_all() -> dict[str, str]:
     """Return contents of all three files."""
     return {
@@ -93,29 +147,85 @@ def log_daily(entry: str) -> None:
 
 
 def update_mastery(concept: str, answer: str, insights: str) -> None:
-    """Record mastery of a concept in memory.md."""
-    entry = (
-        f"\n### {concept}\n"
-        f"- Mastered: {datetime.now().strftime('%Y-%m-%d %H:%M')}\n"
-        f"- Synthesis answer: {answer[:200]}\n"
-        f"- Key insight: {insights}\n"
-    )
-    append("memory.md", entry)
+    """Record mastery of a concept in the memory store."""
+    _ensure_store()
+    cache.store_memory_mastery(concept, answer[:200], insights)
+
+
+def _parse_tree_line(line: str) -> tuple[int, str]:
+    depth = (len(line) - len(line.lstrip(" "))) // 2
+    return depth, line.strip().removeprefix("├─").strip()
 
 
 def update_progress_tree(tree_text: str) -> None:
-    """Replace the Learning Progress Tree section in memory.md."""
-    content = read("memory.md")
-    marker = "## Learning Progress Tree"
-    next_marker = "## Synthesis Insights"
-
-    if marker in content and next_marker in content:
-        before = content[: content.index(marker)]
-        after = content[content.index(next_marker):]
-        new_content = before + marker + "\n\n" + tree_text + "\n\n" + after
-        overwrite("memory.md", new_content)
-    else:
-        append("memory.md", f"\n{marker}\n\n{tree_text}\n")
+    """Replace the Learning Progress Tree; only nodes that changed are rewritten."""
+    _ensure_store()
+    nodes = [_parse_tree_line(line) for line in tree_text.split("\n") if line.strip()]
+    cache.store_memory_tree(nodes)
+
+
+# ── Structured views ───────────────────────────────────────────────────
+
+def records() -> list[tuple[str, str]]:
+    """
+    The knowledge graph as (record_id, text) pairs for search. Ids are
+    stable for the lifetime of a row, so indexes can update incrementally.
+    """
+    _ensure_store()
+    out = [(f"profile:{field}", f"{field}: {value}") for field, value in cache.get_memory_profile()]
+    out += [
+        (f"topic:{cache.normalize_topic(concept)}", f"Mastered: {concept} ({_fmt_time(at)})")
+        for concept, at in cache.get_memory_topics()
+    ]
+    out += [(f"tree:{pos}", f"Learning progress: {topic}") for pos, (_, topic) in enumerate(cache.get_memory_tree())]
+    out += [
+        (f"insight:{id_}", f"{concept} — synthesis answer: {answer} — key insight: {insight}")
+        for id_, concept, answer, insight, _ in cache.get_memory_insights()
+    ]
+    return out
+
+
+def revision() -> int:
+    """Changes whenever the memory store is written."""
+    return cache.memory_revision()
+
+
+def render_memory() -> str:
+    """Render the memory store in the memory.md layout."""
+    _ensure_store()
+    parts = ["# User Knowledge Graph\n\n## User Profile\n"]
+    parts += [f"- {field}: {value}\n" for field, value in cache.get_memory_profile()]
+    parts.append("\n## Topics Mastered\n")
+    parts += [f"- {concept} ({_fmt_time(at)})\n" for concept, at in cache.get_memory_topics()]
+    parts.append("\n## Learning Progress Tree\n\n")
+    parts += [f"{'  ' * depth}├─ {topic}\n" for depth, topic in cache.get_memory_tree()]
+    parts.append("\n## Synthesis Insights\n")
+    for _, concept, answer, insight, created_at in cache.get_memory_insights():
+        parts.append(
+            f"\n### {concept}\n"
+            f"- Mastered: {_fmt_time(created_at)}\n"
+            f"- Synthesis answer: {answer}\n"
+            f"- Key insight: {insight}\n"
+        )
+    return "".join(parts)
+
+
+def export_memory() -> str:
+    """Write memory.md from the store if it changed since the last export; return its content."""
+    global _exported_revision
+    _ensure_store()
+    current = revision()
+    if current == _exported_revision and os.path.exists(_path("memory.md")):
+        return _read_file("memory.md")
+    content = render_memory()
+    os.makedirs(config.MEMORY_DIR, exist_ok=True)
+    overwrite("memory.md", content)
+    _exported_revision = current
+    return content
+
+
+def _fmt_time(ts: int) -> str:
+    return datetime.fromtimestamp(ts).strftime("%Y-%m-%d %H:%M")
 
 
 def reset_daily() -> None:
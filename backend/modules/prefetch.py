@@ -0,0 +1,104 @@
+"""
+Speculative Prefetch — starts the LLM calls the next chat turn will most
+likely need (the current concept's synthesis question, the next concept's
+explanation) as soon as a response goes out. Results live in a short-lived
+in-memory cache keyed by concept + known-set; work for sessions that stop
+sending requests is cancelled.
+"""
+
+import asyncio
+import time
+from typing import Awaitable, Callable, Optional
+
+from config import config
+from modules import cache
+from modules import llm_client
+
+
+# key → (expires_at, session_id, task)
+_entries: dict[tuple, tuple[float, str, asyncio.Task]] = {}
+_last_seen: dict[str, float] = {}
+
+
+def _key(kind: str, concept: str, related: list[str]) -> tuple:
+    return (
+        kind,
+        cache.normalize_topic(concept),
+        frozenset(cache.normalize_topic(r) for r in related),
+    )
+
+
+def touch(session_id: str) -> None:
+    """Mark a session as active and drop expired or abandoned work."""
+    _last_seen[session_id] = time.time()
+    _sweep()
+
+
+def schedule(
+    session_id: str,
+    kind: str,
+    concept: str,
+    related: list[str],
+    factory: Callable[[], Awaitable[str]],
+) -> None:
+    """Start `factory()` in the background unless the same result is already pending."""
+    if not config.PREFETCH_ENABLED:
+        return
+    key = _key(kind, concept, related)
+    if key in _entries:
+        return
+
+    async def _run() -> str:
+        # Speculative work must never write into the requester's token stream
+        llm_client.set_token_sink(None)
+        llm_client.set_request_budget(None)
+        return await factory()
+
+    task = asyncio.create_task(_run())
+    task.add_done_callback(_discard_exception)
+    _entries[key] = (time.time() + config.PREFETCH_TTL_SECS, session_id, task)
+
+
+async def claim(kind: str, concept: str, related: list[str]) -> Optional[str]:
+    """Take a prefetched result, waiting for it if still in flight. None on miss."""
+    entry = _entries.pop(_key(kind, concept, related), None)
+    if entry is None:
+        return None
+    expires_at, _, task = entry
+    if expires_at < time.time():
+        task.cancel()
+        return None
+    try:
+        text = await asyncio.shield(task)
+    except asyncio.CancelledError:
+        if not task.cancelled():
+            raise
+        return None
+    except Exception:
+        return None
+    return None if text.startswith("Error:") else text
+
+
+def drop_session(session_id: str) -> None:
+    """Cancel and forget all prefetch work started for a session."""
+    for key, (_, owner, task) in list(_entries.items()):
+        if owner == session_id:
+            task.cancel()
+            del _entries[key]
+    _last_seen.pop(session_id, None)
+
+
+def _sweep() -> None:
+    now = time.time()
+    for session_id, seen in list(_last_seen.items()):
+        if now - seen > config.PREFETCH_SESSION_IDLE_SECS:
+            drop_session(session_id)
+    for key, (expires_at, _, task) in list(_entries.items()):
+        if expires_at < now:
+            task.cancel()
+            del _entries[key]
+
+
+def _discard_exception(task: asyncio.Task) -> None:
+    if not task.cancelled() and task.exception() is not None:
+        print(f"[PREFETCH] {task.exception()}")
@@ -3,11 +3,16 @@ Prerequisite Tree Builder — recursively decomposes a topic into prerequisites
 until reaching fundamental facts, then produces a bottom-up teaching order.
 """
 
+import asyncio
 import json
-from typing import Any
+from typing import Any, Awaitable, Callable, Optional
 
-from modules.llm_client import call_llm
+from config import config
+from modules.llm_client import acall_llm, call_llm
 from modules import cache
+from modules import search
+from modules import single_flight
+from modules.flat_tree import NODE_TYPES, FlatTree
 
 
 DECOMPOSE_PROMPT = """You are a knowledge decomposition expert. Break down the topic "{topic}" into its prerequisite concepts.
@@ -27,62 +32,456 @@ Or just: FACT"""
 
 FACT_EXPLAIN_PROMPT = """Explain "{topic}" in exactly ONE simple sentence that a 10-year-old could understand. No jargon."""
 
+BATCH_DECOMPOSE_PROMPT = """You are a knowledge decomposition expert. Break down EACH of the topics below into its prerequisite concepts.
+
+Rules:
+1. For each topic, list 2-4 prerequisite concepts that someone MUST understand BEFORE they can learn it.
+2. Each prerequisite must be SIMPLER than its topic.
+3. If a topic is a basic fact that can be explained in ONE sentence without prerequisites, mark it as a fact and give that sentence, simple enough for a 10-year-old. No jargon.
+4. Order prerequisites from most fundamental to most complex.
+
+Topics (JSON array):
+{topics}
+
+RESPOND WITH ONLY A JSON OBJECT (no extra text), with one key per topic, spelled exactly as given:
+{{"<topic>": {{"prerequisites": ["First prerequisite", "Second prerequisite"]}}, "<basic fact topic>": {{"fact": "One simple sentence."}}}}"""
+
+BATCH_FACT_PROMPT = """Explain EACH of the topics below in exactly ONE simple sentence that a 10-year-old could understand. No jargon.
+
+Topics (JSON array):
+{topics}
+
+RESPOND WITH ONLY A JSON OBJECT (no extra text) mapping each topic, spelled exactly as given, to its sentence."""
+
 
 def build_prerequisite_tree(
     topic: str,
     depth: int = 0,
     max_depth: int = 5,
     visited: set | None = None,
-) -> dict:
+) -> FlatTree:
     """
     Recursively build a prerequisite tree for the given topic.
-    Returns a dict: {topic, type, explanation?, children[]}
+    Returns a FlatTree; to_dict() gives {topic, type, explanation?, children[]}.
     """
-    if visited is None:
-        visited = set()
+    return _build_tree(topic, depth, max_depth, visited, _decompose, _explain_fact)
 
+
+async def build_prerequisite_tree_concurrent(
+    topic: str,
+    max_depth: int = 5,
+    max_concurrency: int = 8,
+) -> FlatTree:
+    """
+    Build the same tree as build_prerequisite_tree, expanding siblings concurrently.
+
+    LLM calls for the whole tree are issued up front (at most max_concurrency
+    in flight), then the tree is assembled in the serial builder's depth-first
+    order, so the shape and `visited` cycle handling are identical.
+    Concurrent requests for the same topic (in any worker) share one build.
+    """
+    cached = await asyncio.to_thread(cache.get_cached_tree, topic)
+    if cached:
+        return cached
+    return await single_flight.run(
+        f"tree:{cache.normalize_topic(topic)}:{max_depth}",
+        lambda: _build_tree_concurrent(topic, max_depth, max_concurrency),
+        lookup=lambda: cache.get_cached_tree(topic),
+        lease_secs=config.SINGLE_FLIGHT_TREE_LEASE_SECS,
+    )
+
+
+async def _build_tree_concurrent(topic: str, max_depth: int, max_concurrency: int) -> FlatTree:
+    prefetch = _prefetch_tree_batched if config.TREE_BATCH_DECOMPOSE else _prefetch_tree
+    prereqs, facts = await prefetch(topic, max_depth, max_concurrency)
+
+    def _decompose_prefetched(t: str) -> list[str]:
+        key = t.lower().strip()
+        return prereqs[key] if key in prereqs else _decompose(t)
+
+    def _explain_prefetched(t: str) -> str:
+        key = t.lower().strip()
+        return facts[key] if key in facts else _explain_fact(t)
+
+    # Rare misses are fetched during assembly, so keep it off the event loop
+    return await asyncio.to_thread(
+        _build_tree, topic, 0, max_depth, None, _decompose_prefetched, _explain_prefetched,
+    )
+
+
+def find_cached_tree(topic: str) -> Optional[dict]:
+    """
+    Resolve a topic to an already-built tree: an exact or normalized key match
+    first, then the cached root whose embedding is most similar (at least
+    config.TREE_MATCH_THRESHOLD). Returns {"tree", "topic", "similarity"},
+    where "topic" is the cached tree's root, or None.
+    """
+    tree = cache.get_cached_tree(topic)
+    if tree:
+        return {"tree": tree, "topic": tree.strings[tree.topic[0]], "similarity": 1.0}
+    if not config.TREE_SEMANTIC_MATCH:
+        return None
+
+    # Compare normalized forms so case and spacing never affect the score
+    keys = {cache.normalize_topic(k): k for k in cache.cached_tree_topics()}
+    try:
+        match = search.match_topic(cache.normalize_topic(topic), list(keys), config.TREE_MATCH_THRESHOLD)
+    except Exception as e:
+        # Missing package, model load or encode failure: build the tree as usual
+        print(f"[TREE] Semantic topic matching unavailable: {e}")
+        return None
+    if match is None:
+        return None
+    tree = cache.get_cached_tree(keys[match[0]])
+    if tree is None:
+        return None
+    return {"tree": tree, "topic": tree.strings[tree.topic[0]], "similarity": match[1]}
+
+
+def _build_tree(
+    topic: str,
+    depth: int,
+    max_depth: int,
+    visited: set | None,
+    decompose: Callable[[str], list[str]],
+    explain: Callable[[str], str],
+) -> FlatTree:
+    # Check the whole-tree cache at the root; deeper levels use the node cache
+    if depth == 0:
+        cached = cache.get_cached_tree(topic)
+        if cached:
+            return cached
+
+    tree = FlatTree()
+    _build_node(tree, -1, topic, depth, max_depth, set() if visited is None else visited, decompose, explain)
+
+    # Cache at root level
+    if depth == 0 and tree.type_of(0) == "CONCEPT":
+        cache.store_tree(topic, tree)
+    return tree
+
+
+def _build_node(
+    tree: FlatTree,
+    parent: int,
+    topic: str,
+    depth: int,
+    max_depth: int,
+    visited: set,
+    decompose: Callable[[str], list[str]],
+    explain: Callable[[str], str],
+) -> None:
+    """Serial depth-first builder; `decompose`/`explain` supply the LLM results."""
     # Prevent cycles
     topic_key = topic.lower().strip()
     if topic_key in visited:
-        return {"topic": topic, "type": "LEAF", "children": [], "reason": "cycle"}
+        tree.add(parent, topic, "LEAF", reason="cycle")
+        return
     visited.add(topic_key)
 
-    # Check cache first
-    cached = cache.get_cached_tree(topic)
-    if cached and depth == 0:
-        return cached
-
     # Max depth reached
     if depth >= max_depth:
-        explanation = call_llm(FACT_EXPLAIN_PROMPT.format(topic=topic))
-        return {"topic": topic, "type": "LEAF", "explanation": explanation, "children": []}
-
-    # Ask LLM for prerequisites
-    response = call_llm(DECOMPOSE_PROMPT.format(topic=topic), temperature=0.4)
-
-    # Basic fact — no prerequisites needed
-    if response.strip().upper() == "FACT" or "FACT" in response.strip().upper().split("\n")[0]:
-        explanation = call_llm(FACT_EXPLAIN_PROMPT.format(topic=topic))
-        return {"topic": topic, "type": "FACT", "explanation": explanation, "children": []}
-
-    # Parse prerequisites from numbered list
-    prerequisites = _parse_prerequisites(response)
+        tree.add(parent, topic, "LEAF", explanation=explain(topic))
+        return
 
+    # Ask LLM for prerequisites — an empty list means a basic fact
+    prerequisites = decompose(topic)
     if not prerequisites:
-        explanation = call_llm(FACT_EXPLAIN_PROMPT.format(topic=topic))
-        return {"topic": topic, "type": "FACT", "explanation": explanation, "children": []}
+        tree.add(parent, topic, "FACT", explanation=explain(topic))
+        return
 
     # Recursively build subtrees
-    tree = {"topic": topic, "type": "CONCEPT", "children": []}
+    node = tree.add(parent, topic, "CONCEPT")
     for prereq in prerequisites[:4]:  # Limit branching factor
-        subtree = build_prerequisite_tree(prereq, depth + 1, max_depth, visited)
-        tree["children"].append(subtree)
+        _build_node(tree, node, prereq, depth + 1, max_depth, visited, decompose, explain)
 
-    # Cache at root level
-    if depth == 0:
-        cache.store_tree(topic, tree)
 
-    return tree
+async def _prefetch_tree(
+    topic: str,
+    max_depth: int,
+    max_concurrency: int,
+) -> tuple[dict[str, list[str]], dict[str, str]]:
+    """
+    Speculatively expand every reachable node concurrently.
+    Returns ({topic_key: prerequisites}, {topic_key: fact explanation}).
+    """
+    semaphore = asyncio.Semaphore(max(1, max_concurrency))
+    prereq_tasks: dict[str, asyncio.Future] = {}
+    fact_tasks: dict[str, asyncio.Future] = {}
+    shallowest: dict[str, int] = {}
+
+    async def _limited(fn: Callable[[str], Awaitable[Any]], arg: str) -> Any:
+        async with semaphore:
+            return await fn(arg)
+
+    def _once(tasks: dict[str, asyncio.Future], fn: Callable[[str], Awaitable[Any]], t: str) -> asyncio.Future:
+        key = t.lower().strip()
+        if key not in tasks:
+            tasks[key] = asyncio.ensure_future(_limited(fn, t))
+        return tasks[key]
+
+    async def _expand(t: str, depth: int, ancestors: frozenset) -> None:
+        key = t.lower().strip()
+        # A repeated topic is expanded once; the serial builder marks later
+        # occurrences as cycles, and any rare miss is fetched during assembly.
+        if shallowest.get(key, max_depth + 1) <= depth:
+            return
+        shallowest[key] = depth
+
+        if depth >= max_depth:
+            await _once(fact_tasks, _aexplain_fact, t)
+            return
+
+        children = await _once(prereq_tasks, _adecompose, t)
+        if not children:
+            await _once(fact_tasks, _aexplain_fact, t)
+            return
+
+        # A child equal to one of its ancestors is always a cycle leaf
+        path = ancestors | {key}
+        await asyncio.gather(*(
+            _expand(child, depth + 1, path)
+            for child in children[:4]
+            if child.lower().strip() not in path
+        ))
+
+    await _expand(topic, 0, frozenset())
+    return (
+        {k: task.result() for k, task in prereq_tasks.items()},
+        {k: task.result() for k, task in fact_tasks.items()},
+    )
+
+
+async def _prefetch_tree_batched(
+    topic: str,
+    max_depth: int,
+    max_concurrency: int,
+) -> tuple[dict[str, list[str]], dict[str, str]]:
+    """
+    Expand the tree one depth level at a time, each level's uncached topics
+    in batched JSON requests (a FACT's explanation comes back with its
+    decomposition), so round trips grow with depth rather than node count.
+    Returns the same maps as _prefetch_tree.
+    """
+    semaphore = asyncio.Semaphore(max(1, max_concurrency))
+    prereqs: dict[str, list[str]] = {}
+    facts: dict[str, str] = {}
+    seen: set[str] = set()
+    frontier: list[tuple[str, frozenset]] = [(topic, frozenset())]
+
+    for depth in range(max_depth + 1):
+        # Breadth-first, so the first sighting of a topic is its shallowest
+        level: dict[str, tuple[str, frozenset]] = {}
+        for t, ancestors in frontier:
+            key = t.lower().strip()
+            if key not in seen:
+                seen.add(key)
+                level[key] = (t, ancestors)
+        if not level:
+            break
+        if depth >= max_depth:
+            await _explain_level([t for t, _ in level.values()], facts, semaphore)
+            break
+
+        await _decompose_level([t for t, _ in level.values()], prereqs, facts, semaphore)
+        await _explain_level(
+            [t for key, (t, _) in level.items() if not prereqs[key] and key not in facts], facts, semaphore,
+        )
+        frontier = []
+        for key, (t, ancestors) in level.items():
+            # A child equal to one of its ancestors is always a cycle leaf
+            path = ancestors | {key}
+            frontier.extend((child, path) for child in prereqs[key][:4] if child.lower().strip() not in path)
+    return prereqs, facts
+
+
+def _batches(topics: list[str]) -> list[list[str]]:
+    size = max(1, config.TREE_BATCH_MAX_TOPICS)
+    return [topics[i:i + size] for i in range(0, len(topics), size)]
+
+
+def _cached_nodes(topics: list[str]) -> list[Optional[dict]]:
+    return [cache.get_cached_node(t) for t in topics]
+
+
+async def _decompose_level(
+    topics: list[str],
+    prereqs: dict[str, list[str]],
+    facts: dict[str, str],
+    semaphore: asyncio.Semaphore,
+) -> None:
+    """Fill `prereqs` (and FACT explanations) for topics, cache first, then batched."""
+    todo = []
+    nodes = await asyncio.to_thread(_cached_nodes, topics)
+    for t, node in zip(topics, nodes):
+        if node and node["prerequisites"] is not None:
+            prereqs[t.lower().strip()] = node["prerequisites"]
+            if node["explanation"]:
+                facts[t.lower().strip()] = node["explanation"]
+        else:
+            todo.append(t)
+
+    async def _batch(chunk: list[str]) -> list[str]:
+        async with semaphore:
+            response = await acall_llm(
+                BATCH_DECOMPOSE_PROMPT.format(topics=json.dumps(chunk)), temperature=0.4, family="decompose",
+            )
+        return _store_batch_decomposition(chunk, response, prereqs, facts)
+
+    missed = [t for chunk_missed in await asyncio.gather(*map(_batch, _batches(todo))) for t in chunk_missed]
+
+    async def _single(t: str) -> None:
+        async with semaphore:
+            prereqs[t.lower().strip()] = await _adecompose(t)
+
+    await asyncio.gather(*map(_single, missed))
+
+
+async def _explain_level(topics: list[str], facts: dict[str, str], semaphore: asyncio.Semaphore) -> None:
+    """Fill `facts` for FACT/LEAF topics, cache first, then batched."""
+    todo = []
+    nodes = await asyncio.to_thread(_cached_nodes, topics)
+    for t, node in zip(topics, nodes):
+        if node and node["explanation"]:
+            facts[t.lower().strip()] = node["explanation"]
+        else:
+            todo.append(t)
+
+    async def _batch(chunk: list[str]) -> list[str]:
+        async with semaphore:
+            response = await acall_llm(BATCH_FACT_PROMPT.format(topics=json.dumps(chunk)), family="fact")
+        answers = _parse_batch(response)
+        missed = []
+        for t in chunk:
+            explanation = answers.get(t.lower().strip())
+            if isinstance(explanation, str) and explanation.strip():
+                facts[t.lower().strip()] = _store_fact(t, explanation.strip())
+            else:
+                missed.append(t)
+        return missed
+
+    missed = [t for chunk_missed in await asyncio.gather(*map(_batch, _batches(todo))) for t in chunk_missed]
+
+    async def _single(t: str) -> None:
+        async with semaphore:
+            facts[t.lower().strip()] = await _aexplain_fact(t)
+
+    await asyncio.gather(*map(_single, missed))
+
+
+def _store_batch_decomposition(
+    chunk: list[str],
+    response: str,
+    prereqs: dict[str, list[str]],
+    facts: dict[str, str],
+) -> list[str]:
+    """Record and cache each well-formed answer; returns the topics that need a per-topic call."""
+    answers = _parse_batch(response)
+    missed = []
+    for t in chunk:
+        key = t.lower().strip()
+        answer = answers.get(key)
+        if not isinstance(answer, dict):
+            missed.append(t)
+            continue
+        fact = answer.get("fact")
+        children = answer.get("prerequisites")
+        if isinstance(fact, str) and fact.strip():
+            prereqs[key], facts[key] = [], fact.strip()
+            cache.store_node(t, prerequisites=[], explanation=facts[key], ttl_days=config.CACHE_TTL_DAYS)
+        elif isinstance(children, list) and any(isinstance(c, str) and c.strip() for c in children):
+            prereqs[key] = [c.strip() for c in children if isinstance(c, str) and c.strip()]
+            cache.store_node(t, prerequisites=prereqs[key], ttl_days=config.CACHE_TTL_DAYS)
+        else:
+            missed.append(t)
+    return missed
+
+
+def _parse_batch(response: str) -> dict[str, Any]:
+    """The JSON object in a batched response, keyed by normalized topic ({} if unparseable)."""
+    start, end = response.find("{"), response.rfind("}")
+    if response.startswith("Error:") or start < 0 or end < start:
+        return {}
+    try:
+        data = json.loads(response[start:end + 1])
+    except json.JSONDecodeError:
+        return {}
+    if not isinstance(data, dict):
+        return {}
+    return {str(k).lower().strip(): v for k, v in data.items()}
+
+
+def _decompose(topic: str) -> list[str]:
+    """
+    Get a topic's prerequisites from the node cache or the LLM.
+    An empty list means the topic is a FACT.
+    """
+    node = cache.get_cached_node(topic)
+    if node and node["prerequisites"] is not None:
+        return node["prerequisites"]
+    prompt = DECOMPOSE_PROMPT.format(topic=topic)
+    prerequisites = _store_decomposition(topic, call_llm(prompt, temperature=0.4, family="decompose"))
+    if prerequisites is None:
+        # Unparseable (possibly a cached completion): ask once more, bypassing the response cache
+        prerequisites = _store_decomposition(topic, call_llm(prompt, temperature=0.4))
+    return prerequisites or []
+
+
+async def _adecompose(topic: str) -> list[str]:
+    """Async variant of _decompose."""
+    node = await asyncio.to_thread(cache.get_cached_node, topic)
+    if node and node["prerequisites"] is not None:
+        return node["prerequisites"]
+    prompt = DECOMPOSE_PROMPT.format(topic=topic)
+    prerequisites = _store_decomposition(topic, await acall_llm(prompt, temperature=0.4, family="decompose"))
+    if prerequisites is None:
+        prerequisites = _store_decomposition(topic, await acall_llm(prompt, temperature=0.4))
+    return prerequisites or []
+
+
+def _store_decomposition(topic: str, response: str) -> Optional[list[str]]:
+    """
+    Parse a DECOMPOSE_PROMPT response and cache it on the node. None when the
+    reply is neither FACT nor a list; it is not cached, so the topic is
+    treated as a leaf for this build only.
+    """
+    if response.startswith("Error:"):
+        return []
+
+    # Basic fact — only an explicit FACT answer counts
+    if response.strip().split("\n")[0].strip(" *`.\"'").upper() == "FACT":
+        prerequisites = []
+    else:
+        # Parse prerequisites from numbered list
+        prerequisites = _parse_prerequisites(response)
+        if not prerequisites:
+            print(f"[TREE] Unparseable decomposition for {topic!r}: {response[:80]!r}")
+            return None
+
+    cache.store_node(topic, prerequisites=prerequisites, ttl_days=config.CACHE_TTL_DAYS)
+    return prerequisites
+
+
+def _explain_fact(topic: str) -> str:
+    """One-sentence FACT/LEAF explanation from the node cache or the LLM."""
+    node = cache.get_cached_node(topic)
+    if node and node["explanation"]:
+        return node["explanation"]
+    return _store_fact(topic, call_llm(FACT_EXPLAIN_PROMPT.format(topic=topic), family="fact"))
+
+
+async def _aexplain_fact(topic: str) -> str:
+    """Async variant of _explain_fact."""
+    node = await asyncio.to_thread(cache.get_cached_node, topic)
+    if node and node["explanation"]:
+        return node["explanation"]
+    return _store_fact(topic, await acall_llm(FACT_EXPLAIN_PROMPT.format(topic=topic), family="fact"))
+
+
+def _store_fact(topic: str, explanation: str) -> str:
+    if not explanation.startswith("Error:"):
+        cache.store_node(topic, explanation=explanation, ttl_days=config.CACHE_TTL_DAYS)
+    return explanation
 
 
 def _parse_prerequisites(response: str) -> list[str]:
@@ -106,52 +505,34 @@ def _parse_prerequisites(response: str) -> list[str]:
     return prerequisites
 
 
-def tree_to_teaching_order(tree: dict) -> list[dict]:
+def _flat(tree: FlatTree | dict) -> FlatTree:
+    return tree if isinstance(tree, FlatTree) else FlatTree.from_dict(tree)
+
+
+def tree_to_teaching_order(tree: FlatTree | dict) -> list[dict]:
     """
     Post-order traversal → bottom-up teaching sequence.
     Returns list of {topic, type, explanation?} dicts (no duplicates).
     """
-    order: list[dict] = []
-    seen: set[str] = set()
+    return _flat(tree).teaching_order()
 
-    def _traverse(node: dict) -> None:
-        for child in node.get("children", []):
-            _traverse(child)
-        key = node["topic"].lower().strip()
-        if key not in seen:
-            seen.add(key)
-            order.append({
-                "topic": node["topic"],
-                "type": node.get("type", "CONCEPT"),
-                "explanation": node.get("explanation", ""),
-            })
 
-    _traverse(tree)
-    return order
-
-
-def tree_to_text(tree: dict, indent: int = 0) -> str:
+def tree_to_text(tree: FlatTree | dict, indent: int = 0) -> str:
     """Pretty-print tree as indented text."""
-    prefix = "  " * indent
-    marker = " [FACT]" if tree.get("type") == "FACT" else ""
-    lines = [f"{prefix}├─ {tree['topic']}{marker}"]
-    for child in tree.get("children", []):
-        lines.append(tree_to_text(child, indent + 1))
-    return "\n".join(lines)
+    return _flat(tree).to_text(indent)
 
 
-def prune_mastered(tree: dict, mastered: set[str]) -> dict:
+def prune_mastered(tree: FlatTree | dict, mastered: set[str]) -> FlatTree:
     """
     Remove already-mastered concepts from the tree.
-    Keeps the node but marks it as MASTERED.
-    """
-    topic_lower = tree["topic"].lower().strip()
-    new_type = "MASTERED" if topic_lower in mastered else tree.get("type", "CONCEPT")
-    pruned_children = [
-        prune_mastered(child, mastered) for child in tree.get("children", [])
-    ]
-    return {
-        **tree,
-        "type": new_type,
-        "children": pruned_children,
-    }
+    Keeps the node but marks it as MASTERED. Only the node-type bytes are
+    copied; structure and strings are shared with `tree`.
+    """
+    flat = _flat(tree)
+    mastered_code = NODE_TYPES.index("MASTERED")
+    mastered_ids = {sid for sid, text in enumerate(flat.strings) if text.lower().strip() in mastered}
+    node_type = bytearray(flat.node_type)
+    for node, topic in enumerate(flat.topic):
+        if topic in mastered_ids:
+            node_type[node] = mastered_code
+    return flat.with_types(node_type)
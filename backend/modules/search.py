@@ -1,21 +1,39 @@
 """
 Hybrid Search — combines keyword (exact) and vector (semantic) search
 across the 3 memory files. Uses sentence-transformers + FAISS for vectors,
-with SQLite-cached embeddings to avoid recomputation.
+with SQLite-cached embeddings to avoid recomputation. The knowledge graph
+(memory.md) is searched through the structured records of the memory store.
 """
 
+import bisect
+import hashlib
+import heapq
+import json
 import os
-from typing import Any
+import string
+import time
+from typing import Any, Optional
 
 import numpy as np
 
 from config import config
 from modules import cache as cache_mod
+from modules import memory_manager
 
 # Lazy-load heavy ML libs
 _model = None
-_index = None
-_index_lines: list[str] = []
+
+# Incremental vector index over memory records, keyed by text hash.
+# Vectors are L2-normalized and scored by inner product (cosine similarity).
+_index = None                       # faiss.IndexIDMap2, persisted next to cache.db
+_index_kind = "flat"                # "flat" | "hnsw" | "ivf"
+_index_trained_on = 0               # corpus size an IVF index was trained on
+_tombstones = 0                     # removed vectors still inside an HNSW graph
+_id_to_line: dict[int, str] = {}
+_index_loaded = False
+_synced_revision: int | None = None
+_index_dirty = False                # changed since the last save
+_index_saved_at = 0.0
 
 
 def _get_model():
@@ -29,104 +47,476 @@ def _get_model():
 
 def _embed(text: str) -> np.ndarray:
     """Get embedding for text, using cache when available."""
-    cached = cache_mod.get_cached_embedding(text, config.EMBEDDING_MODEL)
-    if cached is not None:
-        return np.array(cached)
-    model = _get_model()
-    emb = model.encode([text])[0]
-    cache_mod.store_embedding(text, emb.tolist(), config.EMBEDDING_MODEL)
-    return emb
-
-
-def _build_index(lines: list[str]):
-    """Build FAISS index from memory lines."""
-    global _index, _index_lines
+    return _embed_batch([text])[0]
+
+
+def _embed_batch(texts: list[str]) -> np.ndarray:
+    """
+    Embed many texts at once: one cache lookup for all of them, one batched
+    encode for the misses, one transaction to store the new embeddings.
+    Returns a float32 matrix with one row per text.
+    """
+    cached = cache_mod.get_cached_embeddings(texts, config.EMBEDDING_MODEL)
+    misses = list(dict.fromkeys(t for t in texts if t not in cached))
+    if misses:
+        encoded = _get_model().encode(misses)
+        cache_mod.store_embeddings(
+            list(zip(misses, encoded)),
+            config.EMBEDDING_MODEL,
+        )
+        cached.update(zip(misses, encoded))
+    return np.array([cached[t] for t in texts], dtype="float32")
+
+
+def match_topic(topic: str, candidates: list[str], threshold: float) -> Optional[tuple[str, float]]:
+    """The candidate most similar to `topic` (cosine), if it reaches `threshold`."""
+    if not candidates:
+        return None
+    vectors = _normalized(_embed_batch([topic, *candidates]))
+    similarities = vectors[1:] @ vectors[0]
+    best = int(np.argmax(similarities))
+    if similarities[best] < threshold:
+        return None
+    return candidates[best], float(similarities[best])
+
+
+def _line_id(line: str) -> int:
+    """Stable 63-bit FAISS id for a memory line."""
+    return int.from_bytes(hashlib.sha256(line.encode()).digest()[:8], "little") & 0x7FFF_FFFF_FFFF_FFFF
+
+
+def _index_paths() -> tuple[str, str]:
+    base = os.path.join(os.path.dirname(config.CACHE_DB), "memory.faiss")
+    return base, base + ".json"
+
+
+def choose_index_kind(n: int) -> str:
+    """Index type for a corpus of n lines (VECTOR_INDEX_TYPE, or by size when "auto")."""
+    kind = config.VECTOR_INDEX_TYPE
+    if kind == "auto":
+        if n < config.VECTOR_ANN_MIN_LINES:
+            kind = "flat"
+        elif n < config.VECTOR_IVF_MIN_LINES:
+            kind = "hnsw"
+        else:
+            kind = "ivf"
+    # IVF needs enough points to train its coarse quantizer
+    if kind == "ivf" and n < 39 * _ivf_nlist(n):
+        kind = "flat"
+    return kind
+
+
+def _ivf_nlist(n: int) -> int:
+    return max(1, int(4 * np.sqrt(n)))
+
+
+def make_index(kind: str, vectors: np.ndarray):
+    """Create an empty id-mapped inner-product index; IVF is trained on `vectors`."""
+    import faiss
+
+    dimension = vectors.shape[1]
+    if kind == "hnsw":
+        base = faiss.IndexHNSWFlat(dimension, config.VECTOR_HNSW_M, faiss.METRIC_INNER_PRODUCT)
+        base.hnsw.efConstruction = config.VECTOR_HNSW_EF_CONSTRUCTION
+    elif kind == "ivf":
+        quantizer = faiss.IndexFlatIP(dimension)
+        base = faiss.IndexIVFFlat(quantizer, dimension, _ivf_nlist(len(vectors)), faiss.METRIC_INNER_PRODUCT)
+        base.train(vectors)
+    else:
+        base = faiss.IndexFlatIP(dimension)
+    index = faiss.IndexIDMap2(base)
+    _tune(index, kind)
+    return index
+
+
+def _tune(index, kind: str) -> None:
+    """Apply search-time parameters (not all are persisted by faiss)."""
+    import faiss
+
+    if kind == "hnsw":
+        faiss.downcast_index(index.index).hnsw.efSearch = config.VECTOR_HNSW_EF_SEARCH
+    elif kind == "ivf":
+        faiss.extract_index_ivf(index).nprobe = config.VECTOR_IVF_NPROBE
+
+
+def _normalized(vectors: np.ndarray) -> np.ndarray:
     import faiss
 
-    if not lines:
-        _index = None
-        _index_lines = []
+    vectors = np.ascontiguousarray(vectors, dtype="float32")
+    faiss.normalize_L2(vectors)
+    return vectors
+
+
+def _load_index() -> None:
+    """Reload the persisted index (once per process); start empty if missing or stale."""
+    global _index, _index_kind, _index_trained_on, _tombstones, _id_to_line, _index_loaded
+    _index_loaded = True
+    index_path, lines_path = _index_paths()
+    if not (os.path.exists(index_path) and os.path.exists(lines_path)):
         return
+    import faiss
+    try:
+        with open(lines_path, "r", encoding="utf-8") as f:
+            meta = json.load(f)
+        index = faiss.read_index(index_path)
+    except Exception as e:
+        print(f"[SEARCH] Could not load vector index, rebuilding: {e}")
+        return
+    lines = meta.get("lines", {})
+    if (
+        meta.get("model") != config.EMBEDDING_MODEL
+        or meta.get("metric") != "ip"
+        or index.ntotal != len(lines) + meta.get("tombstones", 0)
+    ):
+        return
+    _index = index
+    _index_kind = meta["kind"]
+    _index_trained_on = meta.get("trained_on", 0)
+    _tombstones = meta.get("tombstones", 0)
+    _id_to_line = {int(i): line for i, line in lines.items()}
+    _tune(_index, _index_kind)
+
 
-    embeddings = np.array([_embed(line) for line in lines], dtype="float32")
-    dimension = embeddings.shape[1]
-    _index = faiss.IndexFlatL2(dimension)
-    _index.add(embeddings)
-    _index_lines = lines
+def save_index() -> None:
+    """Persist the index if it changed since the last save (called at shutdown)."""
+    global _index_dirty, _index_saved_at
+    if _index_dirty:
+        _save_index()
+        _index_dirty, _index_saved_at = False, time.time()
+
+
+def _save_index() -> None:
+    import faiss
+    index_path, lines_path = _index_paths()
+    if _index is None:
+        return
+    faiss.write_index(_index, index_path + ".tmp")
+    with open(lines_path + ".tmp", "w", encoding="utf-8") as f:
+        json.dump({
+            "model": config.EMBEDDING_MODEL,
+            "metric": "ip",
+            "kind": _index_kind,
+            "trained_on": _index_trained_on,
+            "tombstones": _tombstones,
+            "lines": _id_to_line,
+        }, f)
+    os.replace(index_path + ".tmp", index_path)
+    os.replace(lines_path + ".tmp", lines_path)
+
+
+def _needs_rebuild(n: int) -> bool:
+    if _index is None or choose_index_kind(n) != _index_kind:
+        return True
+    if _index_kind == "ivf" and n > 2 * _index_trained_on:
+        return True  # centroids no longer represent the corpus
+    return _tombstones > config.VECTOR_MAX_TOMBSTONE_RATIO * max(n, 1)
+
+
+def _rebuild_index(wanted: dict[int, str]) -> None:
+    """Build a fresh index of the right kind over all wanted lines."""
+    global _index, _index_kind, _index_trained_on, _tombstones, _id_to_line
+    ids = list(wanted)
+    vectors = _normalized(_embed_batch([wanted[i] for i in ids]))
+    _index_kind = choose_index_kind(len(ids))
+    _index = make_index(_index_kind, vectors)
+    _index.add_with_ids(vectors, np.array(ids, dtype="int64"))
+    _index_trained_on = len(ids)
+    _tombstones = 0
+    _id_to_line = dict(wanted)
+
+
+def _sync_index(lines: list[str]) -> None:
+    """Bring the index in line with `lines`: embed only new lines, remove vanished ones."""
+    global _index, _tombstones, _index_dirty
+
+    wanted = {_line_id(line): line for line in lines}
+    stale = [i for i in _id_to_line if i not in wanted]
+    fresh = [i for i in wanted if i not in _id_to_line]
+    if not stale and not fresh:
+        return
+
+    if not wanted:
+        _index, _tombstones = None, 0
+        _id_to_line.clear()
+    elif _needs_rebuild(len(wanted)):
+        _rebuild_index(wanted)
+    else:
+        if stale:
+            if _index_kind == "hnsw":
+                _tombstones += len(stale)  # HNSW graphs cannot delete; filtered at query time
+            else:
+                _index.remove_ids(np.array(stale, dtype="int64"))
+            for i in stale:
+                del _id_to_line[i]
+
+        if fresh:
+            vectors = _normalized(_embed_batch([wanted[i] for i in fresh]))
+            _index.add_with_ids(vectors, np.array(fresh, dtype="int64"))
+            for i in fresh:
+                _id_to_line[i] = wanted[i]
+
+    # Rewriting the whole index per sync is O(N): save at most every VECTOR_INDEX_SAVE_SECS
+    _index_dirty = True
+    if time.time() - _index_saved_at >= config.VECTOR_INDEX_SAVE_SECS:
+        save_index()
 
 
 # ── Exact (keyword) search ─────────────────────────────────────────────
 
+def _tokens(text: str) -> set[str]:
+    """Index tokens: lowercase words without leading punctuation (so "**Gravity**" → "gravity**")."""
+    return {t for t in (w.lstrip(string.punctuation) for w in text.lower().split()) if t}
+
+
+class _Postings:
+    """
+    token → ids, plus the vocabulary kept sorted, so a keyword's matches (every
+    token it is a prefix of) are one bisect range instead of a vocabulary scan.
+    """
+
+    def __init__(self):
+        self.ids: dict[str, set] = {}
+        self.vocab: list[str] = []
+
+    def add(self, token: str, item: Any) -> None:
+        ids = self.ids.get(token)
+        if ids is None:
+            ids = self.ids[token] = set()
+            bisect.insort(self.vocab, token)
+        ids.add(item)
+
+    def discard(self, token: str, item: Any) -> None:
+        ids = self.ids.get(token)
+        if ids is None:
+            return
+        ids.discard(item)
+        if not ids:
+            del self.ids[token]
+            del self.vocab[bisect.bisect_left(self.vocab, token)]
+
+    def matching(self, keyword: str) -> set:
+        """Ids of every token that starts with `keyword` (leading punctuation ignored)."""
+        prefix = keyword.lower().lstrip(string.punctuation)
+        if not prefix:
+            return set()
+        lo = bisect.bisect_left(self.vocab, prefix)
+        hi = bisect.bisect_left(self.vocab, prefix + "\U0010ffff", lo)
+        matched: set = set()
+        for token in self.vocab[lo:hi]:
+            matched |= self.ids[token]
+        return matched
+
+
+class _KeywordIndex:
+    """
+    Inverted index (token → line numbers) over one memory file.
+    Appends are indexed incrementally from the last byte offset; the file
+    is re-indexed from scratch only when it was rewritten.
+    """
+
+    _TAIL = 64  # bytes before the offset used to detect rewrites
+
+    def __init__(self, path: str):
+        self.path = path
+        self._reset()
+
+    def _reset(self) -> None:
+        self.lines: list[str] = [""]
+        self.postings = _Postings()
+        self.offset = 0
+        self.mtime = 0.0
+        self.tail = b""
+
+    def refresh(self) -> None:
+        """Bring the index up to date with the file on disk."""
+        stat = os.stat(self.path)
+        if stat.st_size == self.offset and stat.st_mtime == self.mtime:
+            return
+        if stat.st_size <= self.offset or not self._prefix_unchanged():
+            self._reset()
+
+        with open(self.path, "r", encoding="utf-8") as f:
+            f.seek(self.offset)
+            appended = f.read()
+            self.offset = f.tell()
+        self.mtime = stat.st_mtime
+        with open(self.path, "rb") as f:
+            f.seek(max(0, self.offset - self._TAIL))
+            self.tail = f.read(self.offset - f.tell())
+
+        # The last indexed line may continue in the appended text
+        first = len(self.lines) - 1
+        self._unindex(first)
+        self.lines[first:] = (self.lines[first] + appended).split("\n")
+        for i in range(first, len(self.lines)):
+            for token in _tokens(self.lines[i]):
+                self.postings.add(token, i)
+
+    def _prefix_unchanged(self) -> bool:
+        with open(self.path, "rb") as f:
+            f.seek(max(0, self.offset - len(self.tail)))
+            return f.read(len(self.tail)) == self.tail
+
+    def _unindex(self, i: int) -> None:
+        for token in _tokens(self.lines[i]):
+            self.postings.discard(token, i)
+
+    def lines_matching(self, keyword: str) -> set[int]:
+        """Lines with a word starting with `keyword`."""
+        return self.postings.matching(keyword)
+
+
+class _RecordIndex:
+    """
+    Inverted index (token → record ids) over the structured memory records.
+    Re-synced only when the store's revision moves; unchanged records keep
+    their postings.
+    """
+
+    def __init__(self):
+        self.texts: dict[str, str] = {}
+        self.position: dict[str, int] = {}
+        self.postings = _Postings()
+        self.revision: int | None = None
+
+    def refresh(self) -> None:
+        revision = memory_manager.revision()
+        if revision == self.revision:
+            return
+        records = memory_manager.records()
+        wanted = dict(records)
+        for record_id, text in list(self.texts.items()):
+            if wanted.get(record_id) != text:
+                self._unindex(record_id)
+        for record_id, text in records:
+            if record_id not in self.texts:
+                self.texts[record_id] = text
+                for token in _tokens(text):
+                    self.postings.add(token, record_id)
+        self.position = {record_id: i for i, (record_id, _) in enumerate(records)}
+        self.revision = revision
+
+    def _unindex(self, record_id: str) -> None:
+        for token in _tokens(self.texts.pop(record_id)):
+            self.postings.discard(token, record_id)
+
+    def records_matching(self, keyword: str) -> set[str]:
+        return self.postings.matching(keyword)
+
+
+_keyword_indexes: dict[str, _KeywordIndex] = {}
+_record_index = _RecordIndex()
+
+
+def _keyword_index(fname: str) -> _KeywordIndex | None:
+    fpath = os.path.join(config.MEMORY_DIR, fname)
+    if not os.path.exists(fpath):
+        _keyword_indexes.pop(fpath, None)
+        return None
+    index = _keyword_indexes.get(fpath)
+    if index is None:
+        index = _keyword_indexes[fpath] = _KeywordIndex(fpath)
+    index.refresh()
+    return index
+
+
+def _keyword_counts(matching, keywords: list[str]) -> dict:
+    """How many of the query keywords hit each line/record."""
+    # A keyword matches the words it is a prefix of ("learn" → "learning")
+    matches = {kw: matching(kw) for kw in set(keywords)}
+    counts: dict = {}
+    for kw in keywords:
+        for key in matches[kw]:
+            counts[key] = counts.get(key, 0) + 1
+    return counts
+
+
 def exact_search(query: str, top_k: int = 3) -> list[dict]:
     """Keyword-based search across all 3 memory files."""
     keywords = [w.lower() for w in query.split() if len(w) > 2]
     if not keywords:
         return []
 
+    # (score, file, position) in file/position order so ties rank as before
+    scored: list[tuple[float, str, int]] = []
+    indexes: dict[str, _KeywordIndex] = {}
+    for fname in ("conversation.md", "daily.md"):
+        index = _keyword_index(fname)
+        if index is None:
+            continue
+        indexes[fname] = index
+        counts = _keyword_counts(index.lines_matching, keywords)
+        scored.extend((matched / len(keywords), fname, i) for i, matched in sorted(counts.items()))
+
+    _record_index.refresh()
+    counts = _keyword_counts(_record_index.records_matching, keywords)
+    by_position = sorted((_record_index.position[record_id], matched) for record_id, matched in counts.items())
+    scored.extend((matched / len(keywords), "memory.md", pos) for pos, matched in by_position)
+    record_ids = {pos: record_id for record_id, pos in _record_index.position.items()} if by_position else {}
+
     results: list[dict] = []
-    for fname in ("conversation.md", "daily.md", "memory.md"):
-        fpath = os.path.join(config.MEMORY_DIR, fname)
-        if not os.path.exists(fpath):
+    for score, fname, i in heapq.nlargest(top_k, scored, key=lambda r: r[0]):
+        if fname == "memory.md":
+            record_id = record_ids[i]
+            results.append({
+                "file": fname,
+                "record": record_id,
+                "content": _record_index.texts[record_id],
+                "type": "exact",
+                "score": score,
+            })
             continue
-        with open(fpath, "r", encoding="utf-8") as f:
-            lines = f.read().split("\n")
-
-        for i, line in enumerate(lines):
-            lower = line.lower()
-            matched = sum(1 for kw in keywords if kw in lower)
-            if matched > 0:
-                ctx_start = max(0, i - 2)
-                ctx_end = min(len(lines), i + 3)
-                context = "\n".join(lines[ctx_start:ctx_end])
-                results.append({
-                    "file": fname,
-                    "line": i + 1,
-                    "content": context,
-                    "type": "exact",
-                    "score": matched / len(keywords),
-                })
-
-    results.sort(key=lambda r: r["score"], reverse=True)
-    return results[:top_k]
+        lines = indexes[fname].lines
+        ctx_start = max(0, i - 2)
+        ctx_end = min(len(lines), i + 3)
+        results.append({
+            "file": fname,
+            "line": i + 1,
+            "content": "\n".join(lines[ctx_start:ctx_end]),
+            "type": "exact",
+            "score": score,
+        })
+    return results
 
 
 # ── Vector (semantic) search ───────────────────────────────────────────
 
 def vector_search(query: str, top_k: int = 5) -> list[dict]:
-    """Semantic similarity search over memory.md."""
-    # Read + chunk memory
-    mem_path = os.path.join(config.MEMORY_DIR, "memory.md")
-    if not os.path.exists(mem_path):
-        return []
-    with open(mem_path, "r", encoding="utf-8") as f:
-        raw = f.read()
-
-    lines = [l.strip() for l in raw.split("\n") if l.strip() and len(l.strip()) > 5]
-    if not lines:
-        return []
-
-    # Rebuild index if content changed
-    global _index_lines
-    if lines != _index_lines:
-        _build_index(lines)
-
-    if _index is None:
+    """Semantic similarity search over the memory store's records."""
+    global _synced_revision
+    if not _index_loaded:
+        _load_index()
+
+    # Re-sync only when the memory store changed since the last sync
+    revision = memory_manager.revision()
+    if revision != _synced_revision:
+        _sync_index([text for _, text in memory_manager.records()])
+        _synced_revision = revision
+
+    if _index is None or _index.ntotal == 0:
         return []
 
-    query_emb = _embed(query).astype("float32").reshape(1, -1)
-    k = min(top_k, len(_index_lines))
-    distances, indices = _index.search(query_emb, k)
+    query_emb = _normalized(_embed(query).reshape(1, -1))
+    # Tombstoned HNSW entries can occupy result slots; over-fetch to compensate
+    k = min(top_k + _tombstones, _index.ntotal)
+    similarities, ids = _index.search(query_emb, k)
 
     results: list[dict] = []
-    for i, idx in enumerate(indices[0]):
-        if idx < len(_index_lines):
-            score = 1 / (1 + distances[0][i])
+    seen: set[int] = set()
+    for similarity, line_id in zip(similarities[0], ids[0]):
+        line_id = int(line_id)
+        line = _id_to_line.get(line_id)
+        # A re-added line may also match through its own tombstone
+        if line is not None and line_id not in seen:
+            seen.add(line_id)
             results.append({
                 "file": "memory.md",
-                "content": _index_lines[idx],
+                "content": line,
                 "type": "semantic",
-                "score": float(score),
+                "score": float(similarity),
             })
+            if len(results) == top_k:
+                break
     return results
 
 
@@ -0,0 +1,67 @@
+"""
+Session Store — optional server-side copy of each chat session's teaching
+state, keyed by session id. Every saved turn gives the session a new,
+unique version token (never reused across workers or restarts); clients
+send only (session_id, version) and receive only changed fields.
+A stale or unknown version is a conflict the client resolves by resending
+its full session context (the stateless path).
+"""
+
+import asyncio
+import time
+import uuid
+from collections import OrderedDict
+from typing import Optional
+
+from config import config
+
+
+# session_id → (version, state, last_seen), least recently used first
+_sessions: "OrderedDict[str, tuple[str, dict, float]]" = OrderedDict()
+_locks: dict[str, asyncio.Lock] = {}
+
+
+def get(session_id: str) -> Optional[tuple[str, dict]]:
+    """Current (version, state) of a session, or None if unknown or expired."""
+    _sweep()
+    entry = _sessions.get(session_id)
+    if entry is None:
+        return None
+    version, state, _ = entry
+    _sessions[session_id] = (version, state, time.time())
+    _sessions.move_to_end(session_id)
+    return version, state
+
+
+def put(session_id: str, state: dict) -> str:
+    """Store a session's state and return its new version token."""
+    _sessions.pop(session_id, None)
+    # A random token, not a counter: another worker's copy can never match it
+    version = uuid.uuid4().hex
+    _sessions[session_id] = (version, state, time.time())
+    while len(_sessions) > config.SESSION_STORE_MAX:
+        oldest, _ = _sessions.popitem(last=False)
+        _locks.pop(oldest, None)
+    return version
+
+
+def lock(session_id: str) -> asyncio.Lock:
+    """Per-session lock so concurrent turns of one session run one at a time."""
+    lk = _locks.get(session_id)
+    if lk is None:
+        lk = _locks[session_id] = asyncio.Lock()
+    return lk
+
+
+def drop(session_id: str) -> None:
+    _sessions.pop(session_id, None)
+    _locks.pop(session_id, None)
+
+
+def _sweep() -> None:
+    cutoff = time.time() - config.SESSION_IDLE_SECS
+    while _sessions:
+        session_id, (_, _, last_seen) = next(iter(_sessions.items()))
+        if last_seen >= cutoff:
+            break
+        drop(session_id)
@@ -0,0 +1,92 @@
+"""
+Single Flight — coalesces concurrent identical work (a topic's tree build,
+a cacheable LLM prompt). Within a process, every caller of a key awaits
+one shared task. Across uvicorn workers, the task first takes an SQLite
+lease on the key; a worker that finds the lease held elsewhere polls the
+shared cache until the holder's result lands there, or the lease is
+released or expires, and only then does the work itself. Lease and cache
+calls run on worker threads, off the event loop.
+"""
+
+import asyncio
+import contextvars
+import os
+import uuid
+from collections import Counter
+from typing import Awaitable, Callable, Optional, TypeVar
+
+from config import config
+from modules import cache
+
+T = TypeVar("T")
+
+_OWNER = f"{os.getpid()}:{uuid.uuid4().hex[:8]}"
+_inflight: dict[str, asyncio.Task] = {}
+_stats: Counter = Counter()
+
+
+async def run(
+    key: str,
+    compute: Callable[[], Awaitable[T]],
+    lookup: Optional[Callable[[], Optional[T]]] = None,
+    lease_secs: Optional[float] = None,
+) -> T:
+    """
+    Result of `compute()` for `key`, shared by every concurrent caller.
+    With `lookup` and `lease_secs`, callers in other workers share it too:
+    `lookup()` reads the result from the shared cache that `compute()`
+    writes to (None on a miss); it is how other workers' results are seen.
+    """
+    task = _inflight.get(key)
+    if task is None:
+        _stats["leaders"] += 1
+        # A fresh context: the shared task must not inherit the first caller's token sink
+        task = contextvars.Context().run(asyncio.create_task, _lead(key, compute, lookup, lease_secs))
+        _inflight[key] = task
+        task.add_done_callback(lambda t: _forget(key, t))
+    else:
+        _stats["joined"] += 1
+    # Shielded: one caller disconnecting must not cancel the others' work
+    return await asyncio.shield(task)
+
+
+def stats() -> dict[str, int]:
+    """leaders / joined (same process) / waited_remote (another worker held the lease)."""
+    return dict(_stats)
+
+
+async def _lead(
+    key: str,
+    compute: Callable[[], Awaitable[T]],
+    lookup: Optional[Callable[[], Optional[T]]],
+    lease_secs: Optional[float],
+) -> T:
+    if lookup is None or lease_secs is None or not config.SINGLE_FLIGHT_CROSS_PROCESS:
+        return await compute()
+    while not await asyncio.to_thread(cache.acquire_lease, key, _OWNER, lease_secs):
+        _stats["waited_remote"] += 1
+        result = await _await_remote(key, lookup)
+        if result is not None:
+            return result
+    try:
+        return await compute()
+    finally:
+        await asyncio.to_thread(cache.release_lease, key, _OWNER)
+
+
+async def _await_remote(key: str, lookup: Callable[[], Optional[T]]) -> Optional[T]:
+    """Poll until another worker's result is cached or its lease is gone."""
+    poll = config.SINGLE_FLIGHT_POLL_MS / 1000
+    while True:
+        await asyncio.sleep(poll)
+        result = await asyncio.to_thread(lookup)
+        if result is not None or not await asyncio.to_thread(cache.lease_active, key):
+            # Re-check after release: the holder caches before it lets go
+            return result if result is not None else await asyncio.to_thread(lookup)
+
+
+def _forget(key: str, task: asyncio.Task) -> None:
+    if _inflight.get(key) is task:
+        del _inflight[key]
+    if not task.cancelled():
+        task.exception()  # retrieved by the awaiting callers; avoids "never retrieved" warnings
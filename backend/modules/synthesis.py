@@ -3,7 +3,9 @@ Synthesis Question Generator — creates questions that force the learner
 to COMBINE multiple prerequisites in a novel scenario.
 """
 
-from modules.llm_client import call_llm
+import asyncio
+
+from modules.llm_client import acall_llm, emit_token
 from modules import cache
 
 
@@ -37,28 +39,30 @@ RESPOND IN THIS EXACT FORMAT:
 - What happens if you change one but not the other?"""
 
 
-def generate_synthesis_question(
+async def generate_synthesis_question(
     concept: str,
     prerequisites: list[str],
     difficulty: str = "medium",
 ) -> str:
     """Create a synthesis question combining the given prerequisites."""
     # Check cache
-    cached = cache.get_cached_synthesis(concept, prerequisites)
+    cached = await asyncio.to_thread(cache.get_cached_synthesis, concept, prerequisites)
     if cached:
+        emit_token(cached)
         return cached
 
     if len(prerequisites) < 1:
-        return _single_concept_question(concept)
+        return await _single_concept_question(concept)
 
     prereq_text = "\n".join(f"- {p}" for p in prerequisites)
-    question = call_llm(
+    question = await acall_llm(
         SYNTHESIS_PROMPT.format(
             concept=concept,
             prerequisites=prereq_text,
             difficulty=difficulty,
         ),
         temperature=0.8,
+        stream=True,
     )
 
     # Cache the question
@@ -66,7 +70,7 @@ def generate_synthesis_question(
     return question
 
 
-def _single_concept_question(concept: str) -> str:
+async def _single_concept_question(concept: str) -> str:
     """Fallback for the very first concept (no prerequisites yet)."""
     prompt = f"""Create a simple check-understanding question for "{concept}".
 
@@ -79,4 +83,4 @@ Format:
 **Scenario:** [scenario]
 **Question:** [question]"""
 
-    return call_llm(prompt, temperature=0.8)
+    return await acall_llm(prompt, temperature=0.8, stream=True)
@@ -1,9 +1,23 @@
 """
 Answer Validator — checks whether the user's synthesis answer demonstrates
-genuine INTEGRATION of prerequisites (not just correctness).
+genuine INTEGRATION of prerequisites (not just correctness). A local
+pre-scorer (answer length, embedding coverage of each prerequisite) fails
+clearly inadequate answers without an LLM call; everything else is judged
+by the LLM, whose verdicts are recorded for tuning the pre-scorer. A
+sample of pre-scored answers is also judged by the LLM in the background,
+so the recorded verdicts cover both paths.
 """
 
-from modules.llm_client import call_llm
+import asyncio
+import random
+from typing import Optional
+
+import numpy as np
+
+from config import config
+from modules import cache
+from modules import search
+from modules.llm_client import acall_llm, set_request_budget, set_token_sink
 
 
 VALIDATE_PROMPT = """You are evaluating a student's answer to a synthesis question.
@@ -59,7 +73,7 @@ Format:
 **Question:** [direct question about the missed connection]"""
 
 
-def validate_answer(
+async def validate_answer(
     question: str,
     answer: str,
     prerequisites: list[str],
@@ -76,37 +90,122 @@ def validate_answer(
             "insight": str,
         }
     """
+    if config.VALIDATION_PRESCORE_ENABLED:
+        verdict = await asyncio.to_thread(prescore, answer, prerequisites)
+        if verdict is not None:
+            sample = config.VALIDATION_SHADOW_SAMPLE
+            if config.VALIDATION_RECORD_VERDICTS and sample > 0 and random.random() < sample:
+                _shadow(question, answer, prerequisites, weight=1 / sample)
+            return verdict
+    return await _llm_verdict(question, answer, prerequisites)
+
+
+_shadow_tasks: set[asyncio.Task] = set()
+
+
+def _shadow(question: str, answer: str, prerequisites: list[str], weight: float) -> None:
+    """Record the LLM's verdict on a pre-scored answer, off the request path."""
+    async def _run() -> None:
+        set_token_sink(None)
+        set_request_budget(None)
+        await _llm_verdict(question, answer, prerequisites, weight)
+
+    task = asyncio.create_task(_run())
+    _shadow_tasks.add(task)
+    task.add_done_callback(_shadow_tasks.discard)
+
+
+async def _llm_verdict(question: str, answer: str, prerequisites: list[str], weight: float = 1.0) -> dict:
     prereq_text = ", ".join(prerequisites)
-    response = call_llm(
+    response = await acall_llm(
         VALIDATE_PROMPT.format(
             question=question,
             answer=answer,
             prerequisites=prereq_text,
         ),
         temperature=0.3,
+        family="validate",
+    )
+
+    result = _parse_validation(response)
+    if config.VALIDATION_RECORD_VERDICTS and not response.startswith("Error:"):
+        cache.record_validation(question, answer, prerequisites, result, weight)
+    return result
+
+
+_embeddings_available = True
+
+
+def prescore(answer: str, prerequisites: list[str]) -> Optional[dict]:
+    """
+    A confident FAIL (in validate_answer's format) for an answer that is too
+    short or draws on too few prerequisites, or None when the LLM must judge.
+    A prerequisite counts as covered when its embedding's cosine similarity
+    with the answer reaches VALIDATION_COVERAGE_SIM.
+    """
+    global _embeddings_available
+    words = len(answer.split())
+    if words < config.VALIDATION_MIN_WORDS:
+        return _prescored_fail(
+            0, prerequisites,
+            "That's too short to show how the ideas connect. "
+            f"Try explaining in a few sentences how {', '.join(prerequisites)} fit together.",
+        )
+    if not prerequisites or not _embeddings_available:
+        return None
+
+    try:
+        vectors = search._normalized(search._embed_batch([answer, *prerequisites]))
+    except ImportError as e:
+        print(f"[VALIDATOR] Embedding pre-score disabled: {e}")
+        _embeddings_available = False
+        return None
+    except Exception as e:
+        # Model load / encode failure: leave this answer to the LLM
+        print(f"[VALIDATOR] Embedding pre-score failed: {e}")
+        return None
+    similarities = vectors[1:] @ vectors[0]
+    covered = similarities >= config.VALIDATION_COVERAGE_SIM
+    if covered.mean() > config.VALIDATION_FAIL_COVERAGE:
+        return None
+    missing = [p for p, hit in zip(prerequisites, covered) if not hit]
+    return _prescored_fail(
+        int(40 * float(np.clip(similarities, 0, 1).mean())), missing,
+        f"Your answer doesn't draw on {', '.join(missing)} yet. Try explaining the part each one plays.",
     )
 
-    return _parse_validation(response)
+
+def _prescored_fail(score: int, missing: list[str], feedback: str) -> dict:
+    return {
+        "passed": False,
+        "score": score,
+        "feedback": feedback,
+        "missing": missing,
+        "insight": "",
+        "prescored": True,
+    }
 
 
-def generate_hint(missing: list[str], prerequisites: list[str]) -> str:
+async def generate_hint(missing: list[str], prerequisites: list[str]) -> str:
     """Generate a targeted hint based on missed connections."""
-    return call_llm(
+    return await acall_llm(
         HINT_PROMPT.format(
             missing=", ".join(missing),
             prerequisites=", ".join(prerequisites),
         ),
         temperature=0.7,
+        stream=True,
+        family="hint",
     )
 
 
-def generate_followup(
+async def generate_followup(
     concept: str,
     prerequisites: list[str],
     missing: list[str],
 ) -> str:
     """Generate a simpler followup question targeting missed connections."""
-    return call_llm(
+    return await acall_llm(
         FOLLOWUP_PROMPT.format(
             concept=concept,
             missing=", ".join(missing),
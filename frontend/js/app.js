@@ -33,10 +33,8 @@ async function handleSubmit(e) {
     showTypingIndicator();
 
     try {
-        const data = await sendMessage(message);
-
-        // Save the bot response to session
-        addBotMessage(data.response, data.type); // persists to session
+        // Streams the bot response into the chat and persists it to session
+        const data = await sendMessageStreaming(message);
 
         // Update session state from backend response
         if (data.session_update) {
@@ -130,8 +128,7 @@ async function quickStart(topic) {
     showTypingIndicator();
 
     try {
-        const data = await sendMessage(`Learn: ${topic}`);
-        addBotMessage(data.response, data.type);
+        const data = await sendMessageStreaming(`Learn: ${topic}`);
 
         if (data.session_update) {
             _applySessionUpdate(data.session_update);
@@ -174,8 +171,7 @@ async function startReviewSession() {
     try {
         setLoading(true);
         showTypingIndicator();
-        const data = await sendMessage(`[REVIEW] ${due.map(c => c.concept_id).join(',')}`);
-        addBotMessage(data.response, data.type);
+        const data = await sendMessageStreaming(`[REVIEW] ${due.map(c => c.concept_id).join(',')}`);
 
         if (data.session_update) {
             _applySessionUpdate(data.session_update);
@@ -1,15 +1,110 @@
 /**
  * chat.js — Handles sending messages, rendering bubbles, and markdown formatting.
  * Updated: messages now optionally save to session via a `persist` flag.
+ * Updated: replies stream token-by-token from /api/chat/stream.
+ * Updated: once the server holds a session, only its id + version are sent.
  */
 
 const API = '';
 
 /** Send a message to the backend and get a response.
- *  Now includes session_context so the backend is stateless.
+ *  Sends the session version if the server holds this session, else the full context.
  */
 async function sendMessage(message) {
+    const res = await _postChat('/api/chat', message);
+    const data = await res.json();
+    _rememberSessionVersion(data);
+    return data;
+}
+
+/** Send a message to the streaming endpoint and render the reply as it arrives.
+ *  Tokens are painted into a live bot bubble; the final frame replaces it with
+ *  the complete response and is persisted to the session.
+ *  Resolves with the final frame (same shape as the /api/chat response).
+ */
+async function sendMessageStreaming(message) {
+    const res = await _postChat('/api/chat/stream', message);
+    if (!res.ok || !res.body) throw new Error(`Stream failed: ${res.status}`);
+
+    const reader = res.body.getReader();
+    const decoder = new TextDecoder();
+    let buffer = '';
+    let text = '';
+    let bubble = null;
+    let final = null;
+
+    while (!final) {
+        const { value, done } = await reader.read();
+        if (done) break;
+        buffer += decoder.decode(value, { stream: true });
+
+        let newline;
+        while ((newline = buffer.indexOf('\n')) >= 0) {
+            const line = buffer.slice(0, newline).trim();
+            buffer = buffer.slice(newline + 1);
+            if (!line) continue;
+
+            const frame = JSON.parse(line);
+            if (frame.event === 'token') {
+                text += frame.text;
+                if (bubble) {
+                    bubble.innerHTML = renderMarkdown(text);
+                    scrollToBottom();
+                } else {
+                    bubble = addBotMessage(text, 'message', false);
+                }
+            } else if (frame.event === 'done') {
+                final = frame;
+            } else if (frame.event === 'conflict') {
+                // Session moved on server-side before this turn ran — resync
+                updateCurrentSession({ serverVersion: null });
+                return sendMessageStreaming(message);
+            }
+        }
+    }
+    if (!final) throw new Error('Stream ended without a final frame');
+    _rememberSessionVersion(final);
+
+    if (bubble) {
+        bubble.innerHTML = renderMarkdown(final.response);
+        scrollToBottom();
+        addMessageToSession('bot', final.response, final.type);
+    } else {
+        addBotMessage(final.response, final.type);
+    }
+    return final;
+}
+
+/** POST a chat request; on a 409 version conflict, resend once with the full context. */
+async function _postChat(path, message) {
+    const post = () => fetch(`${API}${path}`, {
+        method: 'POST',
+        headers: { 'Content-Type': 'application/json' },
+        body: JSON.stringify(_chatRequestBody(message)),
+    });
+    let res = await post();
+    if (res.status === 409) {
+        updateCurrentSession({ serverVersion: null });
+        res = await post();
+    }
+    return res;
+}
+
+/** Record the server-side session version so the next request can send a delta. */
+function _rememberSessionVersion(data) {
+    if (data.session_version !== undefined) {
+        updateCurrentSession({ serverVersion: data.session_version });
+    }
+}
+
+/** Build the request body: message plus either the server-side session version
+ *  or the full session context (stateless fallback).
+ */
+function _chatRequestBody(message) {
     const session = getCurrentSession();
+    if (session.serverVersion != null) {
+        return { message, session_id: session.id, session_version: session.serverVersion };
+    }
 
     const sessionContext = {
         tree: session.tree,
@@ -22,13 +117,7 @@ async function sendMessage(message) {
         all_topics: session.allTopics || [],
         explained_current: session.explainedCurrent,
     };
-
-    const res = await fetch(`${API}/api/chat`, {
-        method: 'POST',
-        headers: { 'Content-Type': 'application/json' },
-        body: JSON.stringify({ message, session_context: sessionContext }),
-    });
-    return res.json();
+    return { message, session_context: sessionContext, session_id: session.id };
 }
 
 /** Add a user message bubble to the chat.
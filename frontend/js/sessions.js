@@ -55,6 +55,7 @@ function createSession(title = 'New Chat') {
         targetTopic: '',         // latest topic being learned
         allTopics: [],           // all topics asked in this session
         explainedCurrent: false,
+        serverVersion: null,     // server-side session version (null = send full context)
 
         // Chat messages for UI rendering
         chatHistory: [],         // [{role, content, type, time}]